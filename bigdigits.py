@@ -0,0 +1,117 @@
+# Large seven-segment digits for the SSD1306 driver
+#
+# Every glyph is rendered once into its own MONO_VLSB FrameBuffer tile, so
+# drawing a readout is one blit per character, and Readout only blits the
+# characters that changed since the previous frame. Placing readouts at a y
+# that is a multiple of 8 keeps the dirty region to whole display pages.
+
+import framebuf
+
+# Segment bits, a (top) clockwise to f, then g (middle)
+SEG_A = 0x01
+SEG_B = 0x02
+SEG_C = 0x04
+SEG_D = 0x08
+SEG_E = 0x10
+SEG_F = 0x20
+SEG_G = 0x40
+DIGIT_SEGMENTS = {
+    '0': 0x3F, '1': 0x06, '2': 0x5B, '3': 0x4F, '4': 0x66,
+    '5': 0x6D, '6': 0x7D, '7': 0x07, '8': 0x7F, '9': 0x6F,
+    '-': SEG_G, ' ': 0,
+}
+
+
+class Glyph(framebuf.FrameBuffer):
+    """FrameBuffer tile that knows its size, so SSD1306.blit marks only its area."""
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.buffer = bytearray(((height + 7) // 8) * width)
+        super().__init__(self.buffer, width, height, framebuf.MONO_VLSB)
+
+
+class DigitFont():
+    """Pre-rendered glyphs for 0-9, '-', ' ', '.' and ':'.
+
+    Digits are digit_width wide and height tall with segments thickness
+    pixels thick; every tile carries spacing blank columns on its right so
+    a blit also clears the gap to the next character.
+    """
+    def __init__(self, digit_width=12, height=24, thickness=3, spacing=2):
+        self.height = height
+        self.glyphs = {}
+        for char, segments in DIGIT_SEGMENTS.items():
+            self.glyphs[char] = self.render_digit(segments, digit_width, height, thickness, spacing)
+        # Punctuation is only as wide as a segment
+        dot = Glyph(thickness + spacing, height)
+        dot.fill_rect(0, height - thickness, thickness, thickness, 1)
+        self.glyphs['.'] = dot
+        colon = Glyph(thickness + spacing, height)
+        colon.fill_rect(0, height // 3 - thickness // 2, thickness, thickness, 1)
+        colon.fill_rect(0, 2 * height // 3 - thickness // 2, thickness, thickness, 1)
+        self.glyphs[':'] = colon
+
+    @staticmethod
+    def render_digit(segments, w, h, t, spacing):
+        glyph = Glyph(w + spacing, h)
+        mid = h // 2 - t // 2           # top of the middle segment
+        upper = mid - t                 # height of the upper verticals
+        lower = h - t - (mid + t)       # height of the lower verticals
+        for bit, x, y, sw, sh in (
+            (SEG_A, t, 0, w - 2 * t, t),
+            (SEG_B, w - t, t, t, upper),
+            (SEG_C, w - t, mid + t, t, lower),
+            (SEG_D, t, h - t, w - 2 * t, t),
+            (SEG_E, 0, mid + t, t, lower),
+            (SEG_F, 0, t, t, upper),
+            (SEG_G, t, mid, w - 2 * t, t),
+        ):
+            if segments & bit:
+                glyph.fill_rect(x, y, sw, sh, 1)
+        return glyph
+
+    def glyph(self, char):
+        # Anything the font lacks shows as a blank digit
+        glyph = self.glyphs.get(char)
+        return glyph if glyph is not None else self.glyphs[' ']
+
+
+class Readout():
+    """A big-digit text field at a fixed place on a display.
+
+    show() blits only the characters whose glyph or position changed since
+    the previous call, and blanks what is left of a longer previous text.
+    """
+    def __init__(self, display, font, x, y, length):
+        self.display = display
+        self.font = font
+        self.x = x
+        self.y = y
+        self.chars = bytearray(length)  # what each slot shows, 0 for nothing
+        self.xs = bytearray(length)     # x of each slot relative to self.x
+        self.end = 0                    # right edge of the last text
+
+    def show(self, text):
+        display = self.display
+        x = 0
+        for i in range(len(self.chars)):
+            if i >= len(text):
+                self.chars[i] = 0
+                continue
+            char = text[i]
+            glyph = self.font.glyph(char)
+            if self.chars[i] != ord(char) or self.xs[i] != x:
+                display.blit(glyph, self.x + x, self.y)
+                self.chars[i] = ord(char)
+                self.xs[i] = x
+            x += glyph.width
+        if x < self.end:
+            display.fill_rect(self.x + x, self.y, self.end - x, self.font.height, 0)
+        self.end = x
+
+    def invalidate(self):
+        """Forces a full redraw on the next show(), e.g. after the display was cleared."""
+        for i in range(len(self.chars)):
+            self.chars[i] = 0
+        self.end = 0
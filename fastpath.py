@@ -0,0 +1,126 @@
+# Viper versions of the sensor state helpers in sensing.py, which imports
+# them when the port has the native emitter and falls back to its own plain
+# Python copies otherwise. They work on sensing.sensor_words as raw 32-bit
+# words: no int boxing, and no scheduled callback can run in the middle.
+import sys
+import time
+import micropython
+from micropython import const
+
+if sys.implementation.name != 'micropython':
+    raise ImportError("viper code needs MicroPython")
+
+# Must match the layout in sensing.py
+_S_NOW = const(0)
+_S_EDGE_SEQ = const(4)
+_EDGE_LOG_MASK = const(31)
+
+
+@micropython.viper
+def log_edge(words: ptr32, base: int, log: ptr32, active: int):
+    seq = words[base + _S_EDGE_SEQ]
+    i = (seq & _EDGE_LOG_MASK) << 1
+    log[i] = words[base + _S_NOW]
+    log[i + 1] = active
+    words[base + _S_EDGE_SEQ] = seq + 1
+
+
+@micropython.viper
+def set_flags(words: ptr32, index: int, mask: int):
+    words[index] = words[index] | mask
+
+
+@micropython.viper
+def clear_flags(words: ptr32, index: int, mask: int):
+    words[index] = words[index] & (mask ^ -1)
+
+
+@micropython.viper
+def take_flags(words: ptr32, index: int, mask: int) -> int:
+    flags = words[index]
+    words[index] = flags & (mask ^ -1)
+    return flags & mask
+
+
+# --- Native methods ---
+# Native-emitter builds of the methods that run on every edge or every poll.
+# install() swaps them into the sensing classes in place of the bytecode
+# versions, which stay reachable through replaced for comparison. Any change
+# here or there must keep tests/test_fastpath_parity.py passing, which runs
+# both on the same edges.
+_S_LAST_SET = const(1)
+_S_LAST_RELEASE = const(2)
+_S_FLAGS = const(3)
+_F_RELEASE = const(0x02)
+
+_words = None
+_hard_scheduled = None
+_dispatch_hard_edges = None
+replaced = {}
+
+
+@micropython.native
+def is_active(self):
+    return self.pin.value() ^ self.active_low
+
+
+@micropython.native
+def get_pulse_time(self):
+    self.drain()
+    base = self.base
+    if self.pin.value() ^ self.active_low and not _words[base + _S_FLAGS] & _F_RELEASE:
+        end = self.now_ticks()
+    else:
+        end = _words[base + _S_LAST_RELEASE]
+    return self.elapsed(_words[base + _S_LAST_SET], end)
+
+
+@micropython.native
+def hard_handler(self, pin):
+    _words[self.base + _S_NOW] = time.ticks_us()
+    log_edge(_words, self.base, self.edge_log, self.pin.value() ^ self.active_low)
+    if not _hard_scheduled[0]:
+        try:
+            micropython.schedule(_dispatch_hard_edges, 0)
+            _hard_scheduled[0] = 1
+        except Exception:
+            pass
+
+
+@micropython.native
+def soft_handler(self, pin):
+    now = time.ticks_us()
+    _words[self.base + _S_NOW] = now
+    active = self.pin.value() ^ self.active_low
+    log_edge(_words, self.base, self.edge_log, active)
+    self.apply_edge(active, now)
+
+
+@micropython.native
+def get_trip_time(self):
+    self.drain()
+    self.update()
+    count = len(self.gates)
+    if count == 0:
+        return 0
+    # Up to the last gate reached, or to now while the object is on its way
+    i = self.reached - 1
+    if i > count - 2:
+        i = count - 2
+    if i < 0:
+        i = 0
+    return self.cumulative_time(i)
+
+
+def install(timed_sensor, gate_chain, words, hard_scheduled, dispatch_hard_edges):
+    """Replaces the bytecode hot paths of TimedSensor and GateChain with the ones above."""
+    global _words, _hard_scheduled, _dispatch_hard_edges
+    _words = words
+    _hard_scheduled = hard_scheduled
+    _dispatch_hard_edges = dispatch_hard_edges
+    for cls, method in ((timed_sensor, is_active), (timed_sensor, get_pulse_time),
+                        (timed_sensor, hard_handler), (timed_sensor, soft_handler),
+                        (gate_chain, get_trip_time)):
+        name = method.__name__
+        replaced[name] = getattr(cls, name)
+        setattr(cls, name, method)
@@ -1,27 +1,191 @@
 from machine import Pin, UART
-from sensing import TimedSensor, DualPoint
+import sensing
+from sensing import TimedSensor, PIOTimedSensor, GateChain, start_pio_capture, EDGE_LOG_SIZE, EDGE_LOG_MASK
+from sensing import STATUS_SET, STATUS_RELEASE, STATUS_STARTED, STATUS_STOPPED, STATUS_ARM_PENDING
 import micropython as mp
 import ustruct as us
+from snapshot import LiveView, SnapshotView
+from selftest import TimingSelfTest, SELFTEST_RUNNING
+from protocol import (FrameReceiver, encode_frame_into, HEADER_SIZE, FRAME_OVERHEAD,
+                      MAX_PAYLOAD, FRAME_OK, FRAME_LOG)
 import sys
+import json
 import uselect
+import uasyncio as asyncio
 import time
 
 # --- Configuration ---
 # Set to True to use REPL USB CDC for communication
 # Set to False to use UART0 (Pins 0, 1) with a separate adapter
 USE_REPL_COMM = True
+# Default probe pins, in probe id order. The 'CP' command replaces them at
+# runtime and stores the new map in PIN_MAP_FILE.
+PROBE_PINS = (2, 3, 4, 5)
+PIN_MAP_FILE = 'probes.json'
+# The bulk status frame has room for this many probes and their chronometers
+MAX_PROBES = 16
+# Probe pins timestamped by a PIO state machine instead of a soft IRQ. Probes
+# chained in a GateChain must use the same capture method.
+PIO_CAPTURE_PINS = ()
+# Timestamp the other probes from a hard IRQ and defer the rest of the edge
+# handling with micropython.schedule
+HARD_IRQ_CAPTURE = True
+# Report sensor IRQ diagnostics as LOG frames
+DEBUG_SENSORS = False
+# Let the RP2040's second core own the sensors (edge handling, chronometer
+# state) while this core only runs the protocol. IRQ probes then always use
+# hard IRQ capture.
+USE_SECOND_CORE = False
+# Run comm, sensor events and periodic jobs as uasyncio tasks. When False
+# a single uselect.poll loop does the same work.
+USE_ASYNCIO = True
+# PWM output for the 'T' timing self-test, wired to the pins of probes 0
+# and 1 (see selftest.py). None disables the test.
+SELFTEST_PIN = None
+# Show probe pulse times and chronometer trip times on an SSD1306 OLED, for
+# stations without a PC (see station.py). A button from DISPLAY_BUTTON_PIN
+# to GND resets what is on screen with a short press and switches screens
+# with a long one. Chronometer k starts out timing probe 2k to probe 2k+1.
+USE_DISPLAY = False
+DISPLAY_I2C = (0, 16, 17)  # I2C id, SDA pin, SCL pin
+DISPLAY_BUTTON_PIN = 14
+# Frames per second, and bytes sent to the display per main loop pass
+DISPLAY_FPS = 20
+DISPLAY_CHUNK_BYTES = 32
 # -------------------
 
 led = Pin(25, Pin.OUT)  # Pico's built-in LED
+sensing.DEBUG = DEBUG_SENSORS
 
 # --- Sensor Setup ---
-probes = [TimedSensor(2), TimedSensor(3), TimedSensor(4), TimedSensor(5)]
-dps = [DualPoint() for _ in range(len(probes)//2)]
+def make_probe(pin):
+    if pin in PIO_CAPTURE_PINS:
+        return PIOTimedSensor(pin, PIO_CAPTURE_PINS.index(pin))
+    return TimedSensor(pin, hard_irq=HARD_IRQ_CAPTURE or USE_SECOND_CORE)
+
+def load_pin_map():
+    """Returns the stored (pins, active count), or the defaults."""
+    try:
+        with open(PIN_MAP_FILE) as f:
+            config = json.load(f)
+        return list(config['pins']), config['active']
+    except (OSError, ValueError, KeyError):
+        return list(PROBE_PINS), len(PROBE_PINS)
+
+def save_pin_map():
+    with open(PIN_MAP_FILE, 'w') as f:
+        json.dump({'pins': pin_map, 'active': len(probes)}, f)
+
+def check_pin_map(pins, active):
+    reserved = [25] if USE_REPL_COMM else [0, 1, 25]  # LED, UART0
+    if USE_DISPLAY:
+        reserved += [DISPLAY_I2C[1], DISPLAY_I2C[2], DISPLAY_BUTTON_PIN]
+    if SELFTEST_PIN is not None:
+        reserved.append(SELFTEST_PIN)
+    if not 1 <= active <= min(len(pins), MAX_PROBES):
+        raise ValueError("invalid probe count")
+    for pin in pins:
+        if not 0 <= pin <= 28 or pin in reserved or pins.count(pin) > 1:
+            raise ValueError("invalid probe pin %d" % pin)
+
+def configure_probes(pins, active):
+    """Replaces the probe set with the first active pins of pins. Hold the view."""
+    global pin_map, probes, dps
+    check_pin_map(pins, active)
+    if selftest is not None:
+        selftest.stop()
+    for dp in dps:
+        dp.restore_probes()
+    for probe in probes:
+        probe.disable()
+    pin_map = pins
+    probes = [make_probe(pin) for pin in pins[:active]]
+    start_pio_capture(probes)
+    dps = [GateChain() for _ in range(len(probes)//2)]
+    if station is not None:
+        pair_probes(probes, dps)
+    view.replace(probes, dps)
+
+pin_map, active_probes = load_pin_map()
+try:
+    check_pin_map(pin_map, active_probes)
+except ValueError:
+    pin_map, active_probes = list(PROBE_PINS), len(PROBE_PINS)
+probes = [make_probe(pin) for pin in pin_map[:active_probes]]
+start_pio_capture(probes)
+dps = [GateChain() for _ in range(len(probes)//2)]
+# All protocol code reads and changes sensor state through view, inside a
+# "with view:" block
+view = SnapshotView(probes, dps) if USE_SECOND_CORE else LiveView(probes, dps)
+
+selftest = TimingSelfTest(SELFTEST_PIN) if SELFTEST_PIN is not None else None
+
+# --- Display Setup ---
+station = None
+if USE_DISPLAY:
+    from machine import I2C
+    from ssd1306 import SSD1306_I2C
+    from station import StationDisplay, pair_probes
+    with view:
+        pair_probes(probes, dps)
+    i2c = I2C(DISPLAY_I2C[0], sda=Pin(DISPLAY_I2C[1]), scl=Pin(DISPLAY_I2C[2]), freq=400000)
+    station = StationDisplay(SSD1306_I2C(128, 64, i2c), view, DISPLAY_BUTTON_PIN)
 
 # --- Communication Setup ---
-END_PACKET_DELIMITER = b"akb"
-comm_buffer = b""
-cmd = b''
+# Incoming bytes are reassembled into frames (see protocol.py) in a fixed
+# ring. A completed frame is left in rx.frame, with its type byte first, and
+# replies are packed into tx_buf. Everything is allocated once so the
+# steady-state command path does not touch the heap.
+RX_BUFFER_SIZE = 512
+rx = FrameReceiver(RX_BUFFER_SIZE)
+rx_chunk = bytearray(64)
+rx_byte = bytearray(1)
+tx_buf = bytearray(FRAME_OVERHEAD + MAX_PAYLOAD)
+tx_mv = memoryview(tx_buf)
+tx_views = {}
+# Reply bytes the link did not take at once wait here, see TxBacklog
+TX_BACKLOG_SIZE = 1024
+# How often a stalled link is retried
+TX_RETRY_MS = 1
+# When True, U/A packets are pushed on every sensor edge / finished trip
+# instead of waiting for the host to poll for them (see the 'S' command)
+stream_events = False
+
+# Bulk status frame: type 'B', payload <BB> probe/chronometer counts, then one record
+# per probe (pulse time, flags, last set, last release) and one per chain
+# (trip time, flags). Pulse and trip times are microseconds. The last
+# set/release timestamps are ticks_us, or PIO counts (16 ns, wrapping at
+# 2**32) when the probe flags have STATUS_PIO_CLOCK.
+PROBE_STATUS_FMT = '<LBLL'
+PROBE_STATUS_SIZE = us.calcsize(PROBE_STATUS_FMT)
+DP_STATUS_FMT = '<LB'
+DP_STATUS_SIZE = us.calcsize(DP_STATUS_FMT)
+
+# Chain times frame: type 'G', payload <BBB> chain id, gate count and gates
+# reached, then one <LL> (split, cumulative) record per gate after the first
+CHAIN_HEADER_FMT = '<BBB'
+CHAIN_HEADER_SIZE = us.calcsize(CHAIN_HEADER_FMT)
+CHAIN_RECORD_FMT = '<LL'
+CHAIN_RECORD_SIZE = us.calcsize(CHAIN_RECORD_FMT)
+
+# Self-test frame: type 'T', payload <BLH> state, period and missed trips,
+# then the pulse and the trip error series as <Hllfflll> (count, min, max,
+# mean, stddev, p50, p90, p99), all in microseconds
+SELFTEST_HEADER_FMT = '<BLH'
+SELFTEST_HEADER_SIZE = us.calcsize(SELFTEST_HEADER_FMT)
+SELFTEST_SERIES_FMT = '<Hllfflll'
+SELFTEST_SERIES_SIZE = us.calcsize(SELFTEST_SERIES_FMT)
+# How often a running self-test looks for a finished period
+SELFTEST_POLL_MS = 1
+
+# Edge log frame: type 'E', payload <BLLB> probe id, sequence number of the
+# first entry, sequence number after the last entry and entry count, then
+# one <LB> (timestamp, active) record per entry. Timestamps are in the
+# probe's clock, see STATUS_PIO_CLOCK in the bulk status frame.
+EDGE_LOG_HEADER_FMT = '<BLLB'
+EDGE_LOG_HEADER_SIZE = us.calcsize(EDGE_LOG_HEADER_FMT)
+EDGE_RECORD_FMT = '<LB'
+EDGE_RECORD_SIZE = us.calcsize(EDGE_RECORD_FMT)
 
 if USE_REPL_COMM:
     # Use standard input/output (REPL)
@@ -39,94 +203,491 @@ else:
     poll = None # Not needed for uart.any()
     print("Communication configured for UART0 (Pins 0, 1)")
 
+class TxBacklog():
+    """Writes frames straight from tx_buf and queues what the link does not take.
+
+    Nothing is copied or allocated while the link keeps up. When a write comes
+    back short the rest goes into a preallocated buffer, and flush() sends it
+    before anything new so frames never interleave. A frame that does not
+    fit is dropped, the host resyncs on the next one.
+    """
+    def __init__(self, stream, size=TX_BACKLOG_SIZE):
+        self.stream = stream
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.start = 0
+        self.end = 0
+        self.dropped = 0
+
+    def write(self, data):
+        sent = 0
+        if self.start == self.end:
+            # None from a non-blocking stream means nothing went out
+            sent = self.stream.write(data) or 0
+            if sent == len(data):
+                return
+        self.queue(data, sent)
+
+    def queue(self, data, offset):
+        n = len(data) - offset
+        if self.start == self.end:
+            self.start = self.end = 0
+        elif self.end + n > len(self.buf):
+            # Move what is left to the front
+            queued = self.end - self.start
+            self.buf[:queued] = self.mv[self.start:self.end]
+            self.start, self.end = 0, queued
+        if self.end + n > len(self.buf):
+            self.dropped += 1
+            return
+        self.buf[self.end:self.end + n] = data[offset:]
+        self.end += n
+
+    def flush(self):
+        """Sends as much of the backlog as the link takes. Returns True once it is empty."""
+        if self.start == self.end:
+            return True
+        self.start += self.stream.write(self.mv[self.start:self.end]) or 0
+        return self.start == self.end
+
+tx = TxBacklog(comm_output)
+
+# The main loop sleeps in this poll until serial data arrives, a sensor
+# records an edge or the next periodic job is due
+idle_poll = uselect.poll()
+idle_poll.register(sys.stdin if USE_REPL_COMM else uart, uselect.POLLIN)
+idle_poll.register(sensing.events, uselect.POLLIN)
+
+class PeriodicJobs():
+    """Runs callbacks at fixed periods and tells the main loop how long it may sleep."""
+    def __init__(self):
+        self.jobs = []
+
+    def add(self, period_ms, callback):
+        self.jobs.append([time.ticks_add(time.ticks_ms(), period_ms), period_ms, callback])
+
+    def remove(self, callback):
+        # Builds a new list, so it is safe to call from a running job
+        self.jobs = [job for job in self.jobs if job[2] is not callback]
+
+    def timeout(self):
+        """Milliseconds until the next job is due, -1 when there are none."""
+        if not self.jobs:
+            return -1
+        now = time.ticks_ms()
+        return max(0, min(time.ticks_diff(job[0], now) for job in self.jobs))
+
+    def run_due(self):
+        now = time.ticks_ms()
+        for job in self.jobs:
+            if time.ticks_diff(job[0], now) <= 0:
+                # Keep the original cadence, but never queue up missed runs
+                job[0] = time.ticks_add(job[0], job[1])
+                if time.ticks_diff(job[0], now) <= 0:
+                    job[0] = time.ticks_add(now, job[1])
+                job[2]()
+
+# How often chronometers waiting for a blocked gate check whether it cleared
+ARM_CHECK_MS = 50
+DIAGNOSTICS_MS = 100
+# With the event stream on, running pulse and trip times are pushed this
+# often so the host sees them count up; nothing is sent while all are idle
+LIVE_REFRESH_MS = 200
+
+def update_chronometers():
+    # Arm chronometers whose reset was waiting for a gate to clear, empty
+    # the PIO FIFOs often enough for their timestamps to unwrap and pick up
+    # hard IRQ edges whose dispatcher could not be scheduled
+    with view:
+        for probe in probes:
+            probe.drain()
+        for dp in dps:
+            dp.update()
+    sensing.kick_hard_edges()
+
+def flush_diagnostics():
+    sensing.flush_diagnostics(send_comm_str)
+
+def poll_selftest():
+    with view:
+        selftest.poll()
+    if selftest.state != SELFTEST_RUNNING:
+        jobs.remove(poll_selftest)
+
+def refresh_running():
+    if not stream_events:
+        return
+    for probe_id in range(len(probes)):
+        with view:
+            flags = view.probe_flags(probe_id)
+        # Set but not released yet, the pulse time is still growing
+        if flags & (STATUS_SET | STATUS_RELEASE) == STATUS_SET:
+            send_probe_update(probe_id)
+    for id in range(len(dps)):
+        with view:
+            flags = view.dp_flags(id)
+        if flags & (STATUS_STARTED | STATUS_STOPPED | STATUS_ARM_PENDING) == STATUS_STARTED:
+            send_average_update(id)
+
+jobs = PeriodicJobs()
+jobs.add(ARM_CHECK_MS, update_chronometers)
+jobs.add(LIVE_REFRESH_MS, refresh_running)
+if DEBUG_SENSORS:
+    jobs.add(DIAGNOSTICS_MS, flush_diagnostics)
+if station is not None:
+    # Only draws into the frame buffer and queues the changed pages, the
+    # main loop sends them DISPLAY_CHUNK_BYTES at a time
+    jobs.add(1000 // DISPLAY_FPS, station.render)
+
 def comm_any():
     """Checks if there is data available to read."""
     if USE_REPL_COMM:
-        # Check poll results with a zero timeout (non-blocking)
-        return bool(poll.poll(0))
+        # Check poll results with a zero timeout (non-blocking). ipoll reuses
+        # its result tuple, unlike poll() which builds a new list every call
+        for _ in poll.ipoll(0):
+            return True
+        return False
     else:
         # Use UART's built-in method
         return comm_input.any()
 
-def comm_read(nbytes=None):
-    """Reads data from the communication channel."""
-    return comm_input.read(1)
+def receive(data, length):
+    """Feeds length bytes of data to the frame receiver and runs every complete command."""
+    accepted = 0
+    while accepted < length:
+        accepted += rx.write(data, accepted, length)
+        while rx.next_frame():
+            process_command(rx.frame, rx.length)
+
+def comm_read():
+    """Drains every byte currently available into the receive ring. Returns the byte count."""
+    count = 0
+    if USE_REPL_COMM:
+        # stdin reads block until the requested size arrives, so go one byte
+        # at a time but keep going for as long as poll reports data
+        while comm_any():
+            if not comm_input.readinto(rx_chunk, 1):
+                break
+            receive(rx_chunk, 1)
+            count += 1
+    else:
+        available = comm_input.any()
+        while available:
+            n = comm_input.readinto(rx_chunk, min(available, len(rx_chunk)))
+            if not n:
+                break
+            receive(rx_chunk, n)
+            available -= n
+            count += n
+    return count
+
+def tx_view(length):
+    """Returns a cached memoryview over the first length bytes of tx_buf."""
+    view = tx_views.get(length)
+    if view is None:
+        view = tx_views[length] = tx_mv[:length]
+    return view
 
-def send_comm(data):
-    """Sends data over the communication channel."""
-    comm_output.write(data + END_PACKET_DELIMITER)
+def send_frame(frame_type, length):
+    """Sends the length payload bytes stored at tx_buf[HEADER_SIZE:] as one frame."""
+    tx.write(tx_view(encode_frame_into(tx_buf, frame_type, length)))
+
+def send_ok():
+    send_frame(FRAME_OK, 0)
 
 def send_comm_str(data):
     """Sends a string over the communication channel."""
     #print(data)
-    comm_output.write(b'LOG_'+ data.encode() + END_PACKET_DELIMITER)
-    pass
+    data = data.encode()[:MAX_PAYLOAD]
+    tx_buf[HEADER_SIZE:HEADER_SIZE + len(data)] = data
+    send_frame(FRAME_LOG, len(data))
+
+def send_probe_update(probe_id):
+    with view:
+        us.pack_into('<BL', tx_buf, HEADER_SIZE, probe_id, view.pulse_time(probe_id))
+    send_frame(ord('U'), 5)
+
+def send_average_update(id):
+    with view:
+        us.pack_into('<BL', tx_buf, HEADER_SIZE, id, view.trip_time(id))
+    send_frame(ord('A'), 5)
+
+def send_bulk_status():
+    tx_buf[HEADER_SIZE] = len(probes)
+    tx_buf[HEADER_SIZE + 1] = len(dps)
+    offset = HEADER_SIZE + 2
+    with view:
+        for i in range(len(probes)):
+            us.pack_into(PROBE_STATUS_FMT, tx_buf, offset, view.pulse_time(i),
+                         view.probe_flags(i), view.last_set(i), view.last_release(i))
+            offset += PROBE_STATUS_SIZE
+        for i in range(len(dps)):
+            us.pack_into(DP_STATUS_FMT, tx_buf, offset, view.trip_time(i), view.dp_flags(i))
+            offset += DP_STATUS_SIZE
+    send_frame(ord('B'), offset - HEADER_SIZE)
+
+def send_chain_times(id):
+    offset = HEADER_SIZE + CHAIN_HEADER_SIZE
+    with view:
+        chain = dps[id]
+        chain.drain()
+        chain.update()
+        gate_count = len(chain.gates)
+        us.pack_into(CHAIN_HEADER_FMT, tx_buf, HEADER_SIZE, id, gate_count, chain.reached)
+        for i in range(gate_count - 1):
+            us.pack_into(CHAIN_RECORD_FMT, tx_buf, offset, chain.split_time(i), chain.cumulative_time(i))
+            offset += CHAIN_RECORD_SIZE
+    send_frame(ord('G'), offset - HEADER_SIZE)
+
+def send_edge_log(probe_id, since):
+    """Sends every logged edge of a probe from sequence number since onwards.
+
+    Entries that were already overwritten are skipped, which the host sees as
+    a first sequence number greater than the one it asked for.
+    """
+    probe = probes[probe_id]
+    with view:
+        probe.drain()
+    while True:
+        seq = probe.edge_seq
+        first = min(max(since, seq - EDGE_LOG_SIZE), seq)
+        offset = HEADER_SIZE + EDGE_LOG_HEADER_SIZE
+        for n in range(first, seq):
+            i = n & EDGE_LOG_MASK
+            us.pack_into(EDGE_RECORD_FMT, tx_buf, offset, probe.edge_log[i << 1], probe.edge_log[(i << 1) + 1])
+            offset += EDGE_RECORD_SIZE
+        # The IRQ may have lapped the ring while we copied, try again if so
+        if probe.edge_seq - EDGE_LOG_SIZE <= first:
+            break
+    us.pack_into(EDGE_LOG_HEADER_FMT, tx_buf, HEADER_SIZE, probe_id,
+                 first & 0xFFFFFFFF, seq & 0xFFFFFFFF, seq - first)
+    send_frame(ord('E'), offset - HEADER_SIZE)
 
-def process_command(cmd):
+def send_selftest():
+    offset = HEADER_SIZE
+    us.pack_into(SELFTEST_HEADER_FMT, tx_buf, offset, selftest.state, selftest.period_us, selftest.missed)
+    offset += SELFTEST_HEADER_SIZE
+    with view:
+        # Sorting the samples allocates, this is not for the hot path
+        for stats in (selftest.pulse_stats(), selftest.trip_stats()):
+            us.pack_into(SELFTEST_SERIES_FMT, tx_buf, offset, *stats)
+            offset += SELFTEST_SERIES_SIZE
+    send_frame(ord('T'), offset - HEADER_SIZE)
+
+def send_pin_map():
+    # Frame 'P': <BB> active probe count, pin map length, then the pins
+    tx_buf[HEADER_SIZE] = len(probes)
+    tx_buf[HEADER_SIZE + 1] = len(pin_map)
+    for i in range(len(pin_map)):
+        tx_buf[HEADER_SIZE + 2 + i] = pin_map[i]
+    send_frame(ord('P'), 2 + len(pin_map))
+
+def push_events():
+    """Sends an update for every probe edge, finished trip and armed chronometer since the last call."""
+    for probe_id in range(len(probes)):
+        with view:
+            pending = view.take_probe_pending(probe_id)
+        if pending:
+            send_probe_update(probe_id)
+    for id in range(len(dps)):
+        with view:
+            pending = view.take_trip_pending(id)
+        if pending:
+            send_average_update(id)
+
+def check_length(length, expected):
+    if length < expected:
+        raise ValueError("command too short")
+
+def process_command(cmd, length):
+    """Runs the command frame held in the first length bytes of cmd.
+
+    cmd[0] is the frame type and the payload follows it. cmd is the shared
+    receive buffer, so it is read in place with indexing and unpack_from
+    instead of being sliced.
+    """
+    global stream_events
 #     print(cmd) # DEBUG: Be careful printing when using REPL comms!
     try:
-        if not cmd: # Ignore empty commands
+        if not length: # Ignore empty commands
             return
         if(cmd[0] == ord('r')):  # Reset average mode
-            id = us.unpack('<B', cmd[1:])[0]
-            dps[id].reset()
-            send_comm(b'OK')
+            check_length(length, 2)
+            with view:
+                dps[cmd[1]].reset()
+            send_ok()
         elif(cmd[0] == ord('A')):
-            id = us.unpack('<B', cmd[1:])[0]
-            tout = b'A' + us.pack('<BL', id, dps[id].get_trip_time())
-            send_comm(tout)
+            check_length(length, 2)
+            send_average_update(cmd[1])
         elif(cmd[0] == ord('R')):
-            probe_id = us.unpack('<B', cmd[1:])[0]
-            probes[probe_id].reset()
+            check_length(length, 2)
+            with view:
+                probes[cmd[1]].reset()
             # print(f"Reset PID {probe_id}") # DEBUG: Avoid print
         elif(cmd[0] == ord('U')):
     #         print("probe update request") # DEBUG: Avoid print
-            probe_id = us.unpack('<B', cmd[1:])[0]
-            ptime = probes[probe_id].get_pulse_time()
-            tout = b'U' + us.pack('<BL', probe_id, ptime)
-    #         print(f"Sending time: {ptime} for probe {probe_id} | Started {probes[probe_id].last_set} -> ended {probes[probe_id].last_release}") # DEBUG: Avoid print
-            send_comm(tout)
+            check_length(length, 2)
+            send_probe_update(cmd[1])
+        elif(cmd[0] == ord('G')):
+            # Every split and cumulative time of a chain
+            check_length(length, 2)
+            send_chain_times(cmd[1])
+        elif(cmd[0] == ord('E')):
+            # Edge log of one probe since a host-supplied sequence number
+            check_length(length, 6)
+            send_edge_log(cmd[1], us.unpack_from('<L', cmd, 2)[0])
+        elif(cmd[0] == ord('P')):
+            # Probe registry: active count and pin map
+            send_pin_map()
+        elif(cmd[0] == ord('T')):
+            # Timing self-test: <LH> period (us) and sample count starts a
+            # run, no payload asks for the results so far
+            if selftest is None:
+                raise ValueError("self-test disabled, set SELFTEST_PIN")
+            if length > 1:
+                check_length(length, 7)
+                period_us, samples = us.unpack_from('<LH', cmd, 1)
+                with view:
+                    selftest.start(dps[0], probes[0], probes[1], period_us, samples)
+                jobs.remove(poll_selftest)
+                jobs.add(SELFTEST_POLL_MS, poll_selftest)
+                send_ok()
+            else:
+                send_selftest()
+        elif(cmd[0] == ord('B')):
+            # Status of every probe and chronometer in a single packet
+            send_bulk_status()
+        elif(cmd[0] == ord('S')):
+            # Subscribe (1) / unsubscribe (0) to pushed edge events
+            check_length(length, 2)
+            stream_events = bool(cmd[1])
+            if stream_events:
+                # Drop edges recorded before the subscription
+                with view:
+                    for i in range(len(probes)):
+                        view.take_probe_pending(i)
+                    for i in range(len(dps)):
+                        view.take_trip_pending(i)
+            send_ok()
         elif(cmd[0] == ord('C')):
             # Config mode
+            check_length(length, 2)
             if(cmd[1] == ord('A')):
                 # Config absolute mode
-                id, A_probe, B_probe = us.unpack('<BBB', cmd[2:])
-                dps[id].set_probes(probes[A_probe], probes[B_probe])
+                check_length(length, 5)
+                id, A_probe, B_probe = us.unpack_from('<BBB', cmd, 2)
+                with view:
+                    dps[id].set_probes(probes[A_probe], probes[B_probe])
                 # print(f"Configuring probe {A_probe} as A and {B_probe} as B") # DEBUG: Avoid print
-                send_comm(b'OK')
+                send_ok()
+            elif(cmd[1] == ord('G')):
+                # Chain id followed by the probe ids of its gates, in order
+                check_length(length, 5)
+                with view:
+                    dps[cmd[2]].set_gates([probes[cmd[i]] for i in range(3, length)])
+                send_ok()
+            elif(cmd[1] == ord('P')):
+                # Probe count, optionally followed by a new pin map
+                check_length(length, 3)
+                pins = list(cmd[3:length]) if length > 3 else pin_map
+                changed = pins != pin_map or cmd[2] != len(probes)
+                with view:
+                    configure_probes(pins, cmd[2])
+                # Spare the flash when nothing changed
+                if changed:
+                    save_pin_map()
+                send_pin_map()
             elif(cmd[1] == ord('I')):  # Restore average probes
-                id = us.unpack('<B', cmd[2:])
-                dps[id].restore_probes()
-                send_comm(b'OK')
-        elif(cmd[:3] == b'KBD'):
+                check_length(length, 3)
+                with view:
+                    dps[cmd[2]].restore_probes()
+                send_ok()
+        elif(cmd[0] == ord('K') and length >= 3 and cmd[1] == ord('B') and cmd[2] == ord('D')):
             mp.kbd_intr(3)
             print("Restoring CTRL+C")
             raise KeyboardInterrupt
         else:
-            send_comm_str("unknown command: " + str(cmd)) # DEBUG: Avoid print
+            send_comm_str("unknown command: " + str(bytes(cmd[:length]))) # DEBUG: Avoid print
             pass # Silently ignore unknown commands or send an error code
             # send_comm(b'ERR_UNKNOWN_CMD')
     except Exception as e:
         # print(f"Error processing command {cmd}: {e}") # DEBUG: Avoid print
         # Consider sending an error message back to the UI
-        send_comm_str('ERR_' + f"Error processing command {cmd}: {e}")
+        send_comm_str('ERR_' + f"Error processing command {bytes(cmd[:length])}: {e}")
         pass # Or silently ignore errors for now
 
 def handle_comm():
     """Handles incoming communication data."""
-    global comm_buffer, cmd
     # Check if data is available using the appropriate method
     if comm_any():
         led.toggle()
-        # Read available data. Read all available if using REPL to avoid potential blocking
-        data = comm_read()
-        #print("Got data", data)
-        if data:
-            comm_buffer += data
-            # Process buffer for complete packets
-            while END_PACKET_DELIMITER in comm_buffer:
-                cmd, comm_buffer = comm_buffer.split(END_PACKET_DELIMITER, 1)
-                process_command(cmd)
+        # Drain everything that arrived since the last call; complete commands
+        # are processed as soon as their delimiter lands in the ring
+        comm_read()
+
+def run_poll_loop():
+    while True:
+        # Sleep until there is something to do. Scheduled sensor callbacks
+        # still run while waiting.
+        timeout = jobs.timeout()
+        # Come back soon for replies the link did not take yet
+        if not tx.flush() and not 0 <= timeout <= TX_RETRY_MS:
+            timeout = TX_RETRY_MS
+        # Don't sleep while a display frame is still going out
+        if station is not None and station.pump(DISPLAY_CHUNK_BYTES):
+            timeout = 0
+        for _ in idle_poll.ipoll(timeout):
+            pass
+        handle_comm()
+        if sensing.events.take() and stream_events:
+            push_events()
+        jobs.run_due()
+
+async def drain_output():
+    # StreamWriter.drain() without its per-frame bytes objects, see TxBacklog
+    while not tx.flush():
+        await asyncio.sleep_ms(TX_RETRY_MS)
+
+async def comm_task():
+    reader = asyncio.StreamReader(comm_input)
+    # stdin reads block until the buffer is full, UART returns what it has
+    buf = rx_byte if USE_REPL_COMM else rx_chunk
+    while True:
+        n = await reader.readinto(buf)
+        if n:
+            led.toggle()
+            receive(buf, n)
+            # Anything else already waiting goes in the same pass
+            comm_read()
+            await drain_output()
+
+async def events_task():
+    while True:
+        await sensing.events.async_flag.wait()
+        if sensing.events.take() and stream_events:
+            push_events()
+            await drain_output()
+
+async def jobs_task():
+    while jobs.jobs:
+        await asyncio.sleep_ms(jobs.timeout())
+        jobs.run_due()
+        await drain_output()
+
+# How often display_task checks for a new frame while idle
+DISPLAY_IDLE_MS = 5
+
+async def display_task():
+    while True:
+        # Yield after every chunk so comm and events never wait for a frame
+        await asyncio.sleep_ms(0 if station.pump(DISPLAY_CHUNK_BYTES) else DISPLAY_IDLE_MS)
+
+async def run_tasks():
+    sensing.events.async_flag = asyncio.ThreadSafeFlag()
+    tasks = [comm_task(), events_task(), jobs_task()]
+    if station is not None:
+        tasks.append(display_task())
+    await asyncio.gather(*tasks)
 
 def main():
     print("Starting...", end="")
@@ -134,21 +695,21 @@ def main():
     ## 
     #  This is not enough time to stop execution when the board is freshly
     #  plugged in. This is why there is a special Command "KBD" that restores keyboard
-    #  interrupt. You can use it anywhere by sending "akbKBDakb"
+    #  interrupt. You can use it anywhere by sending a 'K' frame with payload
+    #  b"BD", i.e. protocol.encode_frame(ord('K'), b'BD')
     ##
     mp.kbd_intr(-1)  # Disable the hability to introduce keyboard interrupts by receiving ascii EXT (0x03) byte
     print("Ready")
     try:
-        while True:
-            handle_comm()
-            # It's often good practice to have a small sleep in the main loop
-            # to prevent pegging the CPU if there's nothing to do,
-            # especially if sensor reading isn't happening here.
-            time.sleep_ms(1) # Optional: Adjust as needed
+        if USE_ASYNCIO:
+            asyncio.run(run_tasks())
+        else:
+            run_poll_loop()
     except:
         pass
     mp.kbd_intr(3)
 
 # Assuming sensing.py handles interrupts or polling for the sensors internally
-main()
+if __name__ == "__main__":
+    main()
 
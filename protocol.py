@@ -0,0 +1,134 @@
+# Serial framing shared by the firmware (MicroPython) and the host UI (CPython)
+#
+# Every packet is laid out as
+#
+#   SYNC | VERSION | type | length (<H) | payload (length bytes) | CRC-8
+#
+# The CRC covers everything between SYNC and the CRC byte. The receiver uses
+# the length field to jump straight to the end of a frame, and when a header
+# or CRC does not check out it drops the sync byte and looks for the next one,
+# so a corrupted or truncated packet costs at most that packet.
+
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+
+SYNC = 0xA5
+VERSION = 1
+HEADER_FMT = '<BBBH'
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+CRC_SIZE = 1
+FRAME_OVERHEAD = HEADER_SIZE + CRC_SIZE
+MAX_PAYLOAD = 250
+
+# Frame types sent by the firmware that are not replies to a named command
+FRAME_OK = ord('O')
+FRAME_LOG = ord('L')
+
+
+def _crc8_table():
+    # CRC-8/SMBUS, polynomial x^8 + x^2 + x + 1
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table[i] = crc
+    return table
+
+CRC8_TABLE = _crc8_table()
+
+
+def crc8(buf, start, end, crc=0):
+    for i in range(start, end):
+        crc = CRC8_TABLE[crc ^ buf[i]]
+    return crc
+
+
+def encode_frame_into(buf, frame_type, length):
+    """Frames the length payload bytes already stored at buf[HEADER_SIZE:].
+
+    Returns the total number of bytes of the frame at the start of buf.
+    """
+    struct.pack_into(HEADER_FMT, buf, 0, SYNC, VERSION, frame_type, length)
+    end = HEADER_SIZE + length
+    buf[end] = crc8(buf, 1, end)
+    return end + CRC_SIZE
+
+
+def encode_frame(frame_type, payload=b''):
+    """Returns a new frame holding payload. Convenience for the host side."""
+    buf = bytearray(FRAME_OVERHEAD + len(payload))
+    buf[HEADER_SIZE:HEADER_SIZE + len(payload)] = payload
+    encode_frame_into(buf, frame_type, len(payload))
+    return bytes(buf)
+
+
+class FrameReceiver():
+    """Reassembles frames from a byte stream using a fixed-size ring.
+
+    Bytes go in with write(); every call to next_frame() that returns True
+    leaves the frame type in frame[0] and its payload in frame[1:length].
+    Nothing is allocated after construction.
+    """
+    def __init__(self, size=512):
+        # size must be a power of two larger than the biggest frame
+        self.buf = bytearray(size)
+        self.mask = size - 1
+        self.head = 0
+        self.tail = 0
+        self.frame = bytearray(MAX_PAYLOAD + 1)
+        self.length = 0
+        self.dropped = 0
+
+    def available(self):
+        return (self.head - self.tail) & self.mask
+
+    def write(self, data, start=0, end=None):
+        """Copies data[start:end] into the ring. Returns how many bytes fit."""
+        if end is None:
+            end = len(data)
+        room = self.mask - self.available()
+        if end - start > room:
+            end = start + room
+        head = self.head
+        for i in range(start, end):
+            self.buf[head] = data[i]
+            head = (head + 1) & self.mask
+        self.head = head
+        return end - start
+
+    def _at(self, offset):
+        return self.buf[(self.tail + offset) & self.mask]
+
+    def _resync(self):
+        self.tail = (self.tail + 1) & self.mask
+        self.dropped += 1
+
+    def next_frame(self):
+        while True:
+            # Skip to the next sync byte
+            while self.head != self.tail and self.buf[self.tail] != SYNC:
+                self._resync()
+            avail = self.available()
+            if avail < HEADER_SIZE:
+                return False
+            length = self._at(3) | (self._at(4) << 8)
+            if self._at(1) != VERSION or length > MAX_PAYLOAD:
+                self._resync()
+                continue
+            if avail < FRAME_OVERHEAD + length:
+                return False
+            crc = 0
+            for i in range(1, HEADER_SIZE + length):
+                crc = CRC8_TABLE[crc ^ self._at(i)]
+            if crc != self._at(HEADER_SIZE + length):
+                self._resync()
+                continue
+            self.frame[0] = self._at(2)
+            for i in range(length):
+                self.frame[1 + i] = self._at(HEADER_SIZE + i)
+            self.length = 1 + length
+            self.tail = (self.tail + FRAME_OVERHEAD + length) & self.mask
+            return True
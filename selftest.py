@@ -0,0 +1,119 @@
+# Timing self-test
+#
+# A PWM square wave of known period on SELFTEST_PIN (main.py) is looped back
+# into the pins of probe 0 and probe 1, which are chained as gates A and B
+# of chronometer 0 for the duration of the test. Every period gives one
+# sample of each:
+#
+#   pulse error: probe 0 pulse time minus the actual high time of the wave
+#   trip error:  chronometer 0 trip time, which should be 0 since both gates
+#                see the same edge (i.e. the skew between two probes)
+#
+# When gate B's edge is applied before gate A's the chronometer never
+# completes; such periods are counted as missed trips.
+#
+# The host starts a run and fetches the statistics with the 'T' command,
+# while loading the serial link as it likes. Stopping leaves chronometer 0
+# unconfigured.
+
+from machine import Pin, PWM
+from array import array
+import math
+from sensing import STATUS_RELEASE, STATUS_STOPPED, STATUS_ARM_PENDING
+
+SELFTEST_IDLE = 0
+SELFTEST_RUNNING = 1
+SELFTEST_DONE = 2
+MIN_PERIOD_US = 200
+MAX_PERIOD_US = 100_000  # the RP2040 PWM can't go much below 10 Hz
+
+
+def series_stats(samples, count):
+    """Returns (count, min, max, mean, stddev, p50, p90, p99) of samples[:count]."""
+    if not count:
+        return (0, 0, 0, 0.0, 0.0, 0, 0, 0)
+    values = sorted(samples[i] for i in range(count))
+    mean = sum(values) / count
+    variance = sum((v - mean) * (v - mean) for v in values) / count
+    return (count, values[0], values[-1], mean, math.sqrt(variance),
+            values[count * 50 // 100], values[count * 90 // 100], values[count * 99 // 100])
+
+
+class TimingSelfTest():
+    def __init__(self, pin_number, max_samples=2000):
+        self.pin_number = pin_number
+        self.pwm = None
+        self.state = SELFTEST_IDLE
+        self.period_us = 0
+        self.high_us = 0.0
+        self.chain = None
+        self.probe = None
+        # Errors in microseconds, one pulse per period and one trip per
+        # period unless the trip was missed
+        self.pulse_errors = array('l', [0] * max_samples)
+        self.trip_errors = array('l', [0] * max_samples)
+        self.pulse_count = 0
+        self.trip_count = 0
+        self.missed = 0
+        self.wanted = 0
+
+    def start(self, chain, probe_a, probe_b, period_us, samples):
+        """Starts a run of samples periods. Hold the view."""
+        if not MIN_PERIOD_US <= period_us <= MAX_PERIOD_US:
+            raise ValueError("period must be %d to %d us" % (MIN_PERIOD_US, MAX_PERIOD_US))
+        if not 1 <= samples <= len(self.pulse_errors):
+            raise ValueError("at most %d samples" % len(self.pulse_errors))
+        self.stop()
+        chain.set_gates([probe_a, probe_b])
+        self.chain = chain
+        self.probe = probe_a
+        self.pwm = PWM(Pin(self.pin_number))
+        self.pwm.freq(1_000_000 // period_us)
+        self.pwm.duty_u16(32768)
+        # The divider rounds the frequency, compare against what we really got
+        self.period_us = period_us
+        self.high_us = 500_000 / self.pwm.freq()
+        self.pulse_count = 0
+        self.trip_count = 0
+        self.missed = 0
+        self.wanted = samples
+        self.state = SELFTEST_RUNNING
+        chain.reset()
+
+    def stop(self):
+        if self.pwm is not None:
+            self.pwm.deinit()
+            Pin(self.pin_number, Pin.IN)
+            self.pwm = None
+        if self.chain is not None:
+            self.chain.restore_probes()
+            self.chain = None
+        if self.state == SELFTEST_RUNNING:
+            self.state = SELFTEST_DONE
+
+    def poll(self):
+        """Takes the samples of a period once its high half is over. Hold the view."""
+        if self.state != SELFTEST_RUNNING:
+            return
+        chain = self.chain
+        # Until the chain re-arms the probe still holds the last sampled period
+        if chain.status_flags() & STATUS_ARM_PENDING or not self.probe.status_flags() & STATUS_RELEASE:
+            return
+        self.pulse_errors[self.pulse_count] = round(self.probe.get_pulse_time() - self.high_us)
+        self.pulse_count += 1
+        if chain.status_flags() & STATUS_STOPPED:
+            self.trip_errors[self.trip_count] = chain.get_trip_time()
+            self.trip_count += 1
+        else:
+            self.missed += 1
+        if self.pulse_count == self.wanted:
+            self.stop()
+        else:
+            # Re-arms during the low half of the wave
+            chain.reset()
+
+    def pulse_stats(self):
+        return series_stats(self.pulse_errors, self.pulse_count)
+
+    def trip_stats(self):
+        return series_stats(self.trip_errors, self.trip_count)
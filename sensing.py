@@ -1,123 +1,724 @@
-from machine import Pin
+from machine import Pin, mem32
+from array import array
+import micropython as mp
 import time
+import io
+
+try:
+    import rp2
+except ImportError:
+    rp2 = None
+
+# Bit flags reported by status_flags() in the bulk status packet
+STATUS_SET = 0x01
+STATUS_RELEASE = 0x02
+STATUS_ACTIVE = 0x04
+STATUS_PIO_CLOCK = 0x08  # timestamps are PIO counts, not ticks_us (PIOTimedSensor)
+STATUS_CONFIGURED = 0x01
+STATUS_STARTED = 0x02
+STATUS_STOPPED = 0x04
+STATUS_ARM_PENDING = 0x08
+
+# Every edge, not just the latest set/release, is logged in a per-sensor ring
+# of this many entries (must be a power of two). edge_seq counts all edges
+# ever logged, so edge n lives at entry n & EDGE_LOG_MASK until it is
+# overwritten EDGE_LOG_SIZE edges later.
+EDGE_LOG_SIZE = 32
+EDGE_LOG_MASK = EDGE_LOG_SIZE - 1
+
+# --- Diagnostics ---
+# IRQ handlers must not print: it allocates, blocks on USB CDC and lands in
+# the middle of the binary stream. With DEBUG on they store a (code, pin)
+# pair in a small ring instead, and flush_diagnostics() turns those into
+# text later from the main loop.
+DEBUG = False
+DIAG_SET = 1
+DIAG_RELEASE = 2
+DIAG_IGNORED = 3  # edge after the release of a non auto-resetting sensor
+DIAG_PIO_OVERFLOW = 4  # a full PIO RX FIFO dropped edges, recorded even without DEBUG
+DIAG_NAMES = ('', 'set', 'release', 'ignored', 'PIO FIFO overflow')
+DIAG_LOG_SIZE = 16
+DIAG_LOG_MASK = DIAG_LOG_SIZE - 1
+_diag_log = bytearray(2 * DIAG_LOG_SIZE)
+_diag_seq = array('L', [0, 0])  # events written, events reported
+
+def diag(code, pin_number):
+    """Records a diagnostic event. Safe to call from an IRQ, allocates nothing."""
+    n = _diag_seq[0]
+    i = (n & DIAG_LOG_MASK) << 1
+    _diag_log[i] = code
+    _diag_log[i + 1] = pin_number
+    _diag_seq[0] = n + 1
+
+def flush_diagnostics(log):
+    """Passes every diagnostic event recorded since the last call to log() as text."""
+    written = _diag_seq[0]
+    start = max(_diag_seq[1], written - DIAG_LOG_SIZE)
+    if start > _diag_seq[1]:
+        log("diag: %d events lost" % (start - _diag_seq[1]))
+    for n in range(start, written):
+        i = (n & DIAG_LOG_MASK) << 1
+        log("diag: %s on pin %d" % (DIAG_NAMES[_diag_log[i]], _diag_log[i + 1]))
+    _diag_seq[1] = written
+
+# --- Sensor events ---
+class SensorEvents(io.IOBase):
+    """Pollable flag raised whenever a sensor records a set or release.
+
+    Register it with a uselect.poll next to the serial port and the wait
+    returns as soon as an edge is applied, without any busy loop.
+    """
+    def __init__(self):
+        self.flag = bytearray(1)
+        # Optional uasyncio.ThreadSafeFlag, set along with the flag so an
+        # asyncio task can await events
+        self.async_flag = None
+
+    def notify(self):
+        self.flag[0] = 1
+        if self.async_flag is not None:
+            self.async_flag.set()
+
+    def take(self):
+        """Returns whether an event happened since the last call and clears the flag."""
+        raised = self.flag[0]
+        self.flag[0] = 0
+        return raised
+
+    def ioctl(self, request, arg):
+        if request == 3:  # MP_STREAM_POLL
+            return arg & 0x0001 if self.flag[0] else 0  # POLLIN
+        return 0
+
+events = SensorEvents()
+
+# --- Sensor state ---
+# The state every edge touches lives in one shared array('L'), STATE_WORDS
+# words per sensor starting at sensor.base, instead of in instance
+# attributes: an array store skips the instance dict, needs no heap of its
+# own, and the helpers in fastpath can work on it as raw words from viper
+# code. fastpath.py mirrors this layout.
+MAX_SENSORS = 16
+STATE_WORDS = 6
+S_NOW = 0               # timestamp of the newest edge
+S_LAST_SET = 1
+S_LAST_RELEASE = 2
+S_FLAGS = 3
+S_EDGE_SEQ = 4          # edges ever logged
+S_PROCESSED_SEQ = 5     # edges of the log already applied (hard IRQ)
+# S_FLAGS bits, SET and RELEASE line up with the status flags
+F_SET = STATUS_SET
+F_RELEASE = STATUS_RELEASE
+F_PENDING = 0x08        # recorded but not pushed to the host yet
+sensor_words = array('L', [0] * (STATE_WORDS * MAX_SENSORS))
+_slot_used = bytearray(MAX_SENSORS)
+
+def _alloc_state():
+    for slot in range(MAX_SENSORS):
+        if not _slot_used[slot]:
+            _slot_used[slot] = 1
+            base = slot * STATE_WORDS
+            for i in range(STATE_WORDS):
+                sensor_words[base + i] = 0
+            return base
+    raise ValueError("more than %d sensors" % MAX_SENSORS)
+
+def _free_state(base):
+    _slot_used[base // STATE_WORDS] = 0
+
+try:
+    # Viper/native builds, when the port has the native emitter
+    import fastpath
+    from fastpath import log_edge, set_flags, clear_flags, take_flags
+except (ImportError, SyntaxError):
+    fastpath = None
+
+    def log_edge(words, base, log, active):
+        """Appends the edge at words[base + S_NOW] to log, a ring of (timestamp, level) pairs."""
+        seq = words[base + S_EDGE_SEQ]
+        i = (seq & EDGE_LOG_MASK) << 1
+        log[i] = words[base + S_NOW]
+        log[i + 1] = active
+        words[base + S_EDGE_SEQ] = seq + 1
+
+    def set_flags(words, index, mask):
+        words[index] |= mask
+
+    def clear_flags(words, index, mask):
+        words[index] &= ~mask
+
+    def take_flags(words, index, mask):
+        """Clears mask in words[index], returns which of its bits were set."""
+        flags = words[index]
+        words[index] = flags & ~mask
+        return flags & mask
+
+# --- Hard IRQ capture ---
+# Sensors built with hard_irq=True only log the edge from a hard IRQ, which
+# runs within a few microseconds of the edge even during GC or a long
+# command. Their set/release bookkeeping and trigger callbacks run in one
+# micropython.schedule()d dispatcher, oldest edge first across all sensors.
+# Once another thread owns the edges (take_over_hard_edges) the dispatcher
+# does nothing and leaves the latch set, so the hard IRQ stops scheduling it.
+_hard_sensors = []
+_hard_scheduled = bytearray(1)
+_hard_owned = bytearray(1)
+
+def _dispatch_hard_edges(_):
+    if _hard_owned[0]:
+        return
+    _hard_scheduled[0] = 0
+    process_hard_edges()
+
+def take_over_hard_edges():
+    """Stops the dispatcher for good, the caller runs process_hard_edges() itself."""
+    _hard_owned[0] = 1
+    # The hard IRQ only schedules while this is clear. A dispatcher that is
+    # already queued sees _hard_owned and keeps it set.
+    _hard_scheduled[0] = 1
+
+def kick_hard_edges():
+    """Schedules the dispatcher for edges left waiting because the schedule queue was full."""
+    if _hard_scheduled[0] or _hard_owned[0]:
+        return
+    for sensor in _hard_sensors:
+        if sensor.processed_seq != sensor.edge_seq:
+            try:
+                mp.schedule(_dispatch_hard_edges, 0)
+                _hard_scheduled[0] = 1
+            except RuntimeError:
+                pass
+            return
+
+def process_hard_edges():
+    """Applies every logged hard IRQ edge, oldest first across all sensors."""
+    while True:
+        oldest = None
+        for sensor in _hard_sensors:
+            if sensor.processed_seq != sensor.edge_seq and (
+                    oldest is None or time.ticks_diff(sensor.next_edge_time(), oldest.next_edge_time()) < 0):
+                oldest = sensor
+        if oldest is None:
+            return
+        oldest.process_next_edge()
 
 class TimedSensor():
-    def __init__(self, pin_number, active_low=False, auto_reseting=False, trigger_callback=lambda *args, **kwargs: None):
+    # Timestamps of sensors with the same clock can be compared with each other
+    clock = 'ticks_us'
+
+    def __init__(self, pin_number, active_low=False, auto_reseting=False, trigger_callback=lambda *args, **kwargs: None, hard_irq=False):
         self.pin = Pin(pin_number, Pin.IN)
-        self.now = time.ticks_us()
-        self.last_set = self.now
-        self.last_release = self.now
+        self.pin_number = pin_number
+        # now, last set/release, flags and edge counters, see sensor_words
+        self.base = _alloc_state()
+        now = time.ticks_us()
+        sensor_words[self.base + S_NOW] = now
+        sensor_words[self.base + S_LAST_SET] = now
+        sensor_words[self.base + S_LAST_RELEASE] = now
         self.active_low = active_low
         self.auto_reseting = auto_reseting
+        self.hard_irq = hard_irq
 #         self.last_handled_pin = self.pin
-        self.pin.irq(
-            handler=self.resetting_handler if auto_reseting else self.non_resetting_handler,
-            trigger=Pin.IRQ_FALLING|Pin.IRQ_RISING
-        )
-        self.set_trigger = False
-        self.release_trigger = False
         self.trigger_callback = trigger_callback
         self.owner = None
+        # Ring of (timestamp, level) pairs, edge n is at 2 * (n & EDGE_LOG_MASK)
+        self.edge_log = array('L', [0] * (2 * EDGE_LOG_SIZE))
+        self.attach()
+
+    @property
+    def now(self):
+        return sensor_words[self.base + S_NOW]
+
+    @property
+    def last_set(self):
+        return sensor_words[self.base + S_LAST_SET]
+
+    @property
+    def last_release(self):
+        return sensor_words[self.base + S_LAST_RELEASE]
+
+    @property
+    def edge_seq(self):
+        return sensor_words[self.base + S_EDGE_SEQ]
+
+    @property
+    def processed_seq(self):
+        return sensor_words[self.base + S_PROCESSED_SEQ]
     
-    def resetting_handler(self, pin):
-        self.now = time.ticks_us()
-        if(self.is_active() and not self.set_trigger):
-#             print(f"Active | Prb {self.pin} -> Hnd {pin}")
-            self.last_set = self.now
-            self.set_trigger = True
-            self.trigger_callback()
+    def attach(self):
+        if self.hard_irq:
+            if self not in _hard_sensors:
+                _hard_sensors.append(self)
+            self.pin.irq(handler=self.hard_handler, trigger=Pin.IRQ_FALLING|Pin.IRQ_RISING, hard=True)
         else:
-#             print(f"Active | Prb {self.pin} -> Hnd {pin}")
-            self.last_release = self.now
-            self.release_trigger = True
-    
-    def non_resetting_handler(self, pin):
-        if(self.release_trigger):
-            return
-        self.now = time.ticks_us()
+            self.pin.irq(handler=self.soft_handler, trigger=Pin.IRQ_FALLING|Pin.IRQ_RISING)
+
+    def drain(self, until=None):
+        # Soft IRQ edges are applied as they happen and hard IRQ edges by the
+        # dispatcher. When another probe needs our earlier edges applied first
+        # (until given) we are already in scheduler context, so do it here.
+        if self.hard_irq and until is not None:
+            while self.processed_seq != self.edge_seq and time.ticks_diff(self.next_edge_time(), until) < 0:
+                self.process_next_edge()
+
+    def now_ticks(self):
+        return time.ticks_us()
+
+    def elapsed(self, start, end):
+        """Microseconds from timestamp start to timestamp end."""
+        return time.ticks_diff(end, start)
+
+    def hard_handler(self, pin):
+        # Hard IRQ: no allocation allowed, only log and wake the dispatcher
+        sensor_words[self.base + S_NOW] = time.ticks_us()
+        log_edge(sensor_words, self.base, self.edge_log, self.pin.value() ^ self.active_low)
+        if not _hard_scheduled[0]:
+            try:
+                mp.schedule(_dispatch_hard_edges, 0)
+                _hard_scheduled[0] = 1
+            except Exception:
+                # Schedule queue full (RuntimeError, or MemoryError while the
+                # heap is locked). The edge stays logged, the next edge or
+                # kick_hard_edges() tries again.
+                pass
+
+    def next_edge_time(self):
+        index = self.base + S_PROCESSED_SEQ
+        if self.edge_seq - sensor_words[index] > EDGE_LOG_SIZE:
+            # The log was lapped, the oldest edges are gone
+            sensor_words[index] = self.edge_seq - EDGE_LOG_SIZE
+        return self.edge_log[(sensor_words[index] & EDGE_LOG_MASK) << 1]
+
+    def process_next_edge(self):
+        timestamp = self.next_edge_time()
+        index = self.base + S_PROCESSED_SEQ
+        seq = sensor_words[index]
+        active = self.edge_log[((seq & EDGE_LOG_MASK) << 1) + 1]
+        sensor_words[index] = seq + 1
+        self.apply_edge(active, timestamp)
+
+    def soft_handler(self, pin):
+        now = time.ticks_us()
+        sensor_words[self.base + S_NOW] = now
         active = self.is_active()
-        if(active and not self.set_trigger):
-            print(f"Active {self.is_active()} | Prb {self.pin} -> Hnd {pin}")
-            self.last_set = self.now
-            self.set_trigger = True
+        log_edge(sensor_words, self.base, self.edge_log, active)
+        self.apply_edge(active, now)
+
+    def record(self, index, flag, timestamp):
+        # Stores a set or release and flags it for the host (see main.push_events)
+        sensor_words[self.base + index] = timestamp
+        set_flags(sensor_words, self.base + S_FLAGS, flag | F_PENDING)
+        events.notify()
+
+    def apply_edge(self, active, timestamp):
+        """Updates the set/release state with one edge."""
+        flags = sensor_words[self.base + S_FLAGS]
+        if self.auto_reseting:
+            if(active and not flags & F_SET):
+                if DEBUG:
+                    diag(DIAG_SET, self.pin_number)
+                self.record(S_LAST_SET, F_SET, timestamp)
+                self.trigger_callback()
+            else:
+                if DEBUG:
+                    diag(DIAG_RELEASE, self.pin_number)
+                self.record(S_LAST_RELEASE, F_RELEASE, timestamp)
+            return
+        if(flags & F_RELEASE):
+            if DEBUG:
+                diag(DIAG_IGNORED, self.pin_number)
+            return
+        if(active and not flags & F_SET):
+            if DEBUG:
+                diag(DIAG_SET, self.pin_number)
+            self.record(S_LAST_SET, F_SET, timestamp)
             self.trigger_callback()
         elif(not active):
-            print(f"Inactive {self.is_active()} | Prb {self.pin} -> Hnd {pin}")
-            self.last_release = self.now
-            self.release_trigger = True
+            if DEBUG:
+                diag(DIAG_RELEASE, self.pin_number)
+            self.record(S_LAST_RELEASE, F_RELEASE, timestamp)
+
+    def take_pending(self):
+        """Returns whether there was an unpushed set/release and clears it."""
+        return take_flags(sensor_words, self.base + S_FLAGS, F_PENDING) != 0
 
     def get_pulse_time(self):
-        return time.ticks_diff(time.ticks_us() if self.is_active() and not self.release_trigger else self.last_release, self.last_set)
+        self.drain()
+        base = self.base
+        if self.is_active() and not sensor_words[base + S_FLAGS] & F_RELEASE:
+            end = self.now_ticks()
+        else:
+            end = sensor_words[base + S_LAST_RELEASE]
+        return self.elapsed(sensor_words[base + S_LAST_SET], end)
     
     def is_active(self):
         return self.pin.value()^self.active_low
+
+    def status_flags(self):
+        self.drain()
+        return ((sensor_words[self.base + S_FLAGS] & (STATUS_SET | STATUS_RELEASE))
+                | (STATUS_ACTIVE if self.is_active() else 0))
     
-    def reset(self):
+    def reset(self, drain=True, skip_unprocessed=True):
+        if drain:
+            self.drain()
         # Dont allow the set trigger to be reset if the sensor is currently activated
-        if(not self.is_active()):
-            self.set_trigger = False
-        self.release_trigger = False
-        self.last_release = self.last_set
+        clear_flags(sensor_words, self.base + S_FLAGS, F_RELEASE if self.is_active() else F_SET | F_RELEASE)
+        if self.hard_irq and skip_unprocessed:
+            # Logged edges not applied yet happened before the reset. Not
+            # so for a chain's own reset of its next gate, which keeps the
+            # edges after the previous gate fired.
+            sensor_words[self.base + S_PROCESSED_SEQ] = self.edge_seq
+        if self.owner is not None:
+            self.owner.gate_reset(self, sensor_words[self.base + S_FLAGS] & F_SET != 0)
+        sensor_words[self.base + S_LAST_RELEASE] = sensor_words[self.base + S_LAST_SET]
     
-    def disable(self):
+    def detach(self):
         self.pin.irq(handler=None)
 
+    def disable(self):
+        self.detach()
+        if self in _hard_sensors:
+            _hard_sensors.remove(self)
+        _free_state(self.base)
+
+
+# PIO edge capture: each PIOTimedSensor gets a state machine that counts down
+# in x once every 2 cycles and, on every edge of its pin, pushes the low 31
+# bits of x shifted left with the sampled pin level in bit 0, then raises its
+# IRQ. Every edge costs exactly PIO_EDGE_SKEW counts (6 cycles without a
+# decrement on a rise, 8 with a single one on a fall), which PIOTimedSensor
+# adds back when it converts FIFO entries to timestamps.
+PIO_FREQ = 125_000_000
+PIO_EDGE_SKEW = 3
+PIO_COUNT_MASK = 0xFFFFFFFF
+PIO_FIFO_MASK = 0x7FFFFFFF      # counter bits carried by a FIFO entry
+PIO_FIFO_HALF = 0x40000000
+# "now" is extrapolated from a (ticks_us, count) anchor that is moved forward
+# once it is this old, well inside the ticks_diff range of ticks_us
+PIO_ANCHOR_US = 1 << 24
+# CTRL and FDEBUG registers of PIO0/PIO1. All state machines of a block are
+# started on the same cycle so their counters share a timebase, FDEBUG has
+# an RXSTALL bit per state machine that is set when a push was dropped.
+PIO_CTRL = (0x50200000, 0x50300000)
+PIO_FDEBUG = (0x50200008, 0x50300008)
+
+if rp2 is not None:
+    @rp2.asm_pio(fifo_join=rp2.PIO.JOIN_RX)
+    def _edge_capture():
+        mov(x, invert(null))
+        label("low")
+        jmp(pin, "rise")
+        jmp(x_dec, "low")
+        jmp("low")                  # x wrapped through zero
+        label("rise")
+        in_(x, 31)
+        in_(pins, 1)
+        push(noblock)
+        irq(rel(0))             [1] # wake the CPU, see PIOTimedSensor.attach
+        label("high")
+        jmp(pin, "still_high")
+        jmp("fall")
+        label("still_high")
+        jmp(x_dec, "high")
+        jmp("high")                 # x wrapped through zero
+        label("fall")
+        in_(x, 31)
+        in_(pins, 1)
+        push(noblock)
+        irq(rel(0))             [1] # wake the CPU, see PIOTimedSensor.attach
+        jmp(x_dec, "low")
+        jmp("low")                  # x wrapped through zero
+
+
+class PIOTimedSensor(TimedSensor):
+    """TimedSensor whose edges are timestamped by a PIO state machine.
+
+    Timestamps (last_set, last_release, the edge log) are 32-bit PIO counts,
+    16 ns at 125 MHz, and status_flags() has STATUS_PIO_CLOCK set. They are
+    only read out of the FIFO when drain() runs, which every getter does
+    first; something has to call drain() at least every 15 s or so (main.py
+    does it from a periodic job). Call start_pio_capture() once all sensors
+    are built.
+    """
+    clock = 'pio'
+
+    def __init__(self, pin_number, sm_id, **kwargs):
+        self.sm_id = sm_id
+        self.edges = 0
+        self.level = 0          # pin level after the last applied edge
+        self.held = None        # timestamp and level of an entry read ahead by drain(until)
+        self.held_level = 0
+        self.anchor_us = time.ticks_us()
+        self.anchor_count = 0
+        super().__init__(pin_number, **kwargs)
+
+    def attach(self):
+        if rp2 is None:
+            raise OSError("PIO capture needs the rp2 port")
+        self.sm = rp2.StateMachine(self.sm_id, _edge_capture, freq=PIO_FREQ,
+                                   in_base=self.pin, jmp_pin=self.pin)
+        # Edges are only drained when someone asks, the IRQ just makes sure
+        # a main loop waiting on events wakes up to do so
+        self.sm.irq(lambda sm: events.notify())
+
+    def disable(self):
+        self.sm.active(0)
+        _free_state(self.base)
+
+    def now_ticks(self):
+        # The PIO counter cannot be read while it runs, extrapolate with
+        # ticks_us which is driven by the same crystal
+        diff = time.ticks_diff(time.ticks_us(), self.anchor_us)
+        if diff >= PIO_ANCHOR_US:
+            # An even number of microseconds is a whole number of counts
+            step = diff & ~1
+            self.anchor_us = time.ticks_add(self.anchor_us, step)
+            self.anchor_count = (self.anchor_count + step * PIO_FREQ // 2_000_000) & PIO_COUNT_MASK
+            diff -= step
+        return (self.anchor_count + diff * PIO_FREQ // 2_000_000) & PIO_COUNT_MASK
+
+    def elapsed(self, start, end):
+        return ((end - start) & PIO_COUNT_MASK) * 2_000_000 // PIO_FREQ
+
+    def status_flags(self):
+        return super().status_flags() | STATUS_PIO_CLOCK
+
+    def check_overflow(self):
+        fdebug = PIO_FDEBUG[self.sm_id // 4]
+        stall = 1 << (self.sm_id % 4)
+        if mem32[fdebug] & stall:
+            # Write 1 to clear. Dropped pushes cost their skew too, so later
+            # timestamps are a few counts early; the levels stay right.
+            mem32[fdebug] = stall
+            diag(DIAG_PIO_OVERFLOW, self.pin_number)
+
+    def drain(self, until=None):
+        """Applies queued edges, stopping before the first one after timestamp until."""
+        now = self.now_ticks()
+        self.check_overflow()
+        while True:
+            if self.held is None:
+                if not self.sm.rx_fifo():
+                    return
+                raw = self.sm.get()
+                count = ((PIO_FIFO_MASK - (raw >> 1)) + PIO_EDGE_SKEW * self.edges) & PIO_FIFO_MASK
+                self.edges += 1
+                # Put back the counter bit the FIFO entry has no room for:
+                # the count nearest to now with the same low bits
+                self.held = (now + ((count - now + PIO_FIFO_HALF) & PIO_FIFO_MASK) - PIO_FIFO_HALF) & PIO_COUNT_MASK
+                self.held_level = raw & 1
+            if until is not None and ((self.held - until) & PIO_COUNT_MASK) < 0x80000000:
+                return
+            timestamp = self.held
+            self.held = None
+            if self.held_level == self.level:
+                # No change: the pin was already high when capture started,
+                # a glitch shorter than the sampling, or edges lost to a
+                # full FIFO in between
+                continue
+            self.level = self.held_level
+            sensor_words[self.base + S_NOW] = timestamp
+            log_edge(sensor_words, self.base, self.edge_log, self.level ^ self.active_low)
+            self.apply_edge(self.level ^ self.active_low, timestamp)
+
+
+def start_pio_capture(sensors):
+    """Starts the state machines of every PIOTimedSensor in sensors together."""
+    masks = [0, 0]
+    for sensor in sensors:
+        if isinstance(sensor, PIOTimedSensor):
+            masks[sensor.sm_id // 4] |= 1 << (sensor.sm_id % 4)
+            # A pin already high pushes an entry at once, which drain() skips
+            sensor.level = sensor.pin.value()
+    start_us = time.ticks_us()
+    for block in range(2):
+        if masks[block]:
+            # SM_ENABLE and CLKDIV_RESTART in a single write
+            mem32[PIO_CTRL[block]] |= masks[block] | (masks[block] << 8)
+    for sensor in sensors:
+        if isinstance(sensor, PIOTimedSensor):
+            sensor.anchor_us = start_us
+            sensor.anchor_count = 0
+
 
 class SinglePoint():
     def __init__(self):
         pass
 
 
-class DualPoint():
-    def __init__(self):
-        self.pA: TimedSensor = None
-        self.pB: TimedSensor = None
-    
+# Longest chain a GateChain can hold by default
+MAX_CHAIN_GATES = 8
+
+def _no_callback(*args, **kwargs):
+    pass
+
+
+class GateChain():
+    """Times an object through an ordered chain of gates, A -> B -> C ...
+
+    The first trigger of each gate after the previous gate fired is stored in
+    times, so every split and cumulative time is the difference of two
+    entries. A gate firing out of order is ignored. Resetting one gate (the
+    'R' command) rewinds the chain to before that gate, so R on the first
+    gate starts a new trip like r does.
+    """
+    def __init__(self, max_gates=MAX_CHAIN_GATES):
+        self.gates = []
+        self.times = array('L', [0] * max_gates)
+        # Number of gates triggered so far, in order
+        self.reached = 0
+        # Set when the host should hear about the trip time: the last gate
+        # fired, or a pending reset armed the chain (see update)
+        self.trip_pending = False
+        # A reset was requested while a gate was blocked, the chain arms itself
+        # as soon as every gate clears (see update)
+        self.arm_pending = False
+
     def reset(self, block=False):
-        if self.pA is None:
+        """Re-arms the chain. Unless block is set, returns at once even if a gate is blocked."""
+        if not self.gates:
             return
-        while(self.pA.is_active() or self.pB.is_active()):
-            time.sleep(0.5)
-        self.pA.reset()
-        self.pB.reset()
-    
+        if block:
+            while self.any_active():
+                time.sleep(0.5)
+        self.arm_pending = True
+        self.update()
+
+    def any_active(self):
+        for gate in self.gates:
+            if gate.is_active():
+                return True
+        return False
+
+    def update(self):
+        """Completes a pending reset once every gate is clear. Call it regularly."""
+        if not self.arm_pending or not self.gates:
+            return
+        if self.any_active():
+            return
+        for gate in self.gates:
+            gate.reset()
+        self.reached = 0
+        self.arm_pending = False
+        # Pushed like a finished trip, so a host shown "arming" learns it is over
+        self.trip_pending = True
+        events.notify()
+
+    def drain(self):
+        # In gate order, so each gate's callback sees the next gate's earlier edges
+        for gate in self.gates:
+            gate.drain()
+
     def start_triggered(self):
-        return self.pA.set_trigger
-    
+        return self.reached > 0
+
     def stop_triggered(self):
-        return self.pA.set_trigger and self.pB.set_trigger
+        return len(self.gates) > 0 and self.reached == len(self.gates)
+
+    def status_flags(self):
+        if not self.gates:
+            return 0
+        self.drain()
+        self.update()
+        if self.arm_pending:
+            return STATUS_CONFIGURED | STATUS_ARM_PENDING
+        return (STATUS_CONFIGURED
+                | (STATUS_STARTED if self.start_triggered() else 0)
+                | (STATUS_STOPPED if self.stop_triggered() else 0))
+
+    def segment_end(self, i):
+        # End of segment i (gate i -> gate i+1): its stored time, or now while running
+        if self.reached > i + 1:
+            return self.times[i + 1]
+        return self.gates[0].now_ticks()
+
+    def split_time(self, i):
+        """Time from gate i to gate i+1, still running if the object is in between."""
+        if self.arm_pending or self.reached <= i:
+            return 0
+        return self.gates[0].elapsed(self.times[i], self.segment_end(i))
+
+    def cumulative_time(self, i):
+        """Time from the first gate to gate i+1, same rules as split_time."""
+        if self.arm_pending or self.reached <= i:
+            return 0
+        return self.gates[0].elapsed(self.times[0], self.segment_end(i))
 
     def get_trip_time(self):
-        if self.pA is None or not self.pA.set_trigger:
+        self.drain()
+        self.update()
+        if not self.gates:
             return 0
-        end = self.pB.last_set if self.stop_triggered() else time.ticks_us()
-        return time.ticks_diff(end, self.pA.last_set)
-    
-    def set_probes(self, pA: TimedSensor, pB: TimedSensor):
-        if(isinstance(pA.owner, DualPoint) and pA.owner != self):
-            print("Changing owner")
-            pA.owner.restore_probes()
-        pA.owner = self
-        self.pA = pA
-        self.pA.trigger_callback = self.clear_b_probe
-        if(isinstance(pB.owner, DualPoint) and pB.owner != self):
-            print("Changing owner")
-            pB.owner.restore_probes()
-        pB.owner = self
-        self.pB = pB
+        # Up to the last gate reached, or to now while the object is on its way
+        return self.cumulative_time(max(0, min(self.reached - 1, len(self.gates) - 2)))
+
+    def gate_triggered(self, i):
+        if self.arm_pending or i != self.reached:
+            return
+        gate = self.gates[i]
+        self.times[i] = gate.last_set
+        self.reached = i + 1
+        if self.reached == len(self.gates):
+            self.trip_pending = True
+        else:
+            # Forget what the next gate saw before this one fired. Apply its
+            # queued earlier edges first (PIO and hard IRQ probes) so they
+            # don't come back after the reset, its later ones still count.
+            following = self.gates[i + 1]
+            following.drain(until=gate.last_set)
+            following.reset(drain=False, skip_unprocessed=False)
+
+    def set_gates(self, gates):
+        if not 2 <= len(gates) <= len(self.times):
+            raise ValueError("a chain needs 2 to %d gates" % len(self.times))
+        for gate in gates:
+            if gate.clock != gates[0].clock:
+                raise ValueError("probes use different clocks")
+            if gates.count(gate) > 1:
+                raise ValueError("a probe can only be one gate of a chain")
+        self.restore_probes()
+        for i in range(len(gates)):
+            gate = gates[i]
+            if isinstance(gate.owner, GateChain) and gate.owner is not self:
+                gate.owner.restore_probes()
+            gate.owner = self
+            gate.trigger_callback = self.gate_callback(i)
+        self.gates = list(gates)
         self.reset()
-    
-    def clear_b_probe(self):
-        self.pB.reset()
+
+    def gate_reset(self, gate, still_set):
+        """Called by a gate's reset(): the chain forgets that gate and every later one."""
+        if gate not in self.gates:
+            return
+        # A blocked gate keeps its trigger through a reset, and so does the chain
+        i = self.gates.index(gate) + (1 if still_set else 0)
+        if i < self.reached:
+            self.reached = i
+            self.trip_pending = False
+
+    def gate_callback(self, i):
+        return lambda *args, **kwargs: self.gate_triggered(i)
+
+    def set_probes(self, pA: TimedSensor, pB: TimedSensor):
+        self.set_gates([pA, pB])
 
     def restore_probes(self):
-        if self.pA is not None:
-            self.pA.reset()
-            self.pA.trigger_callback = lambda *args, **kwargs: None
-            self.pA.owner = None
-            self.pA = None
-        if self.pB is not None:
-            self.pB.reset()
-            self.pB.owner = None
-            self.pB = None
+        for gate in self.gates:
+            gate.reset()
+            gate.trigger_callback = _no_callback
+            gate.owner = None
+        self.gates = []
+        self.reached = 0
+        self.trip_pending = False
+        self.arm_pending = False
+
+
+class DualPoint(GateChain):
+    """Two-gate chain: trip time from probe A to probe B."""
+    def __init__(self):
+        super().__init__(max_gates=2)
+
 
+if fastpath is not None:
+    fastpath.install(TimedSensor, GateChain, sensor_words, _hard_scheduled, _dispatch_hard_edges)
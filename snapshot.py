@@ -0,0 +1,172 @@
+# Read access to probe and chronometer state for the protocol code in main.py
+#
+# LiveView reads the sensor objects directly. SnapshotView hands the sensors
+# to the second core, which applies edges and publishes the results into a
+# preallocated array; the first core only ever reads that array. Both are
+# used the same way: hold the view (with view: ...) around every access.
+
+from array import array
+import time
+import sensing
+from sensing import PIOTimedSensor
+
+# Extra flag bit carried in the snapshot: the probe/chronometer has an update
+# that was not pushed to the host yet
+SNAPSHOT_PENDING = 0x80
+PROBE_WORDS = 4  # pulse time, flags, last set, last release
+DP_WORDS = 2  # trip time, flags
+
+
+class LiveView():
+    """Single-core view, every call goes straight to the sensor objects."""
+    def __init__(self, probes, dps):
+        self.probes = probes
+        self.dps = dps
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def replace(self, probes, dps):
+        """Switches to a new probe/chronometer set. Hold the view."""
+        self.probes = probes
+        self.dps = dps
+
+    def pulse_time(self, i):
+        return self.probes[i].get_pulse_time()
+
+    def probe_flags(self, i):
+        return self.probes[i].status_flags()
+
+    def last_set(self, i):
+        return self.probes[i].last_set
+
+    def last_release(self, i):
+        return self.probes[i].last_release
+
+    def take_probe_pending(self, i):
+        probe = self.probes[i]
+        # PIO probes only see their edges once drained
+        probe.drain()
+        return probe.take_pending()
+
+    def trip_time(self, i):
+        return self.dps[i].get_trip_time()
+
+    def dp_flags(self, i):
+        return self.dps[i].status_flags()
+
+    def take_trip_pending(self, i):
+        pending = self.dps[i].trip_pending
+        self.dps[i].trip_pending = False
+        return pending
+
+
+class SnapshotView(LiveView):
+    """Dual-core view: core 1 owns the sensors, core 0 reads a locked snapshot.
+
+    IRQ probes must use hard IRQ capture, since scheduled callbacks only run
+    on the main thread. Only core 1 applies their edges. Their IRQs are
+    detached on core 0 and registered again from core 1, meant to move
+    servicing to core 1 so edge timestamps do not depend on what core 0 is
+    doing. Which core the rp2 port then delivers IO_IRQ_BANK0 to has not
+    been checked on hardware; timestamps are right either way, only their
+    latency depends on it.
+    """
+    def __init__(self, probes, dps, period_us=100):
+        super().__init__(probes, dps)
+        import _thread
+        self.lock = _thread.allocate_lock()
+        self.period_us = period_us
+        # Before core 1 starts, so no dispatcher is left to run on core 0
+        sensing.take_over_hard_edges()
+        self.allocate()
+        _thread.start_new_thread(self.run, ())
+
+    def allocate(self):
+        self.words = array('L', [0] * (PROBE_WORDS * len(self.probes) + DP_WORDS * len(self.dps)))
+        self.dp_base = PROBE_WORDS * len(self.probes)
+        # New probes registered their IRQs on core 0, core 1 takes them over
+        for probe in self.probes:
+            if not isinstance(probe, PIOTimedSensor):
+                probe.detach()
+        self.attached = False
+
+    def replace(self, probes, dps):
+        super().replace(probes, dps)
+        self.allocate()
+
+    def __enter__(self):
+        self.lock.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.lock.release()
+
+    def run(self):
+        while True:
+            with self.lock:
+                if not self.attached:
+                    for probe in self.probes:
+                        # Registered from this core, see the class docstring
+                        if not isinstance(probe, PIOTimedSensor):
+                            probe.attach()
+                    self.attached = True
+                sensing.process_hard_edges()
+                for dp in self.dps:
+                    dp.update()
+                self.publish()
+            time.sleep_us(self.period_us)
+
+    def publish(self):
+        words = self.words
+        for i in range(len(self.probes)):
+            probe = self.probes[i]
+            base = i * PROBE_WORDS
+            pending = words[base + 1] & SNAPSHOT_PENDING
+            probe.drain()
+            if probe.take_pending():
+                pending = SNAPSHOT_PENDING
+            words[base] = probe.get_pulse_time()
+            words[base + 1] = probe.status_flags() | pending
+            words[base + 2] = probe.last_set
+            words[base + 3] = probe.last_release
+        for i in range(len(self.dps)):
+            dp = self.dps[i]
+            base = self.dp_base + i * DP_WORDS
+            pending = words[base + 1] & SNAPSHOT_PENDING
+            if dp.trip_pending:
+                dp.trip_pending = False
+                pending = SNAPSHOT_PENDING
+            words[base] = dp.get_trip_time()
+            words[base + 1] = dp.status_flags() | pending
+
+    def pulse_time(self, i):
+        return self.words[i * PROBE_WORDS]
+
+    def probe_flags(self, i):
+        return self.words[i * PROBE_WORDS + 1] & ~SNAPSHOT_PENDING
+
+    def last_set(self, i):
+        return self.words[i * PROBE_WORDS + 2]
+
+    def last_release(self, i):
+        return self.words[i * PROBE_WORDS + 3]
+
+    def take_probe_pending(self, i):
+        flags = self.words[i * PROBE_WORDS + 1]
+        self.words[i * PROBE_WORDS + 1] = flags & ~SNAPSHOT_PENDING
+        return flags & SNAPSHOT_PENDING
+
+    def trip_time(self, i):
+        return self.words[self.dp_base + i * DP_WORDS]
+
+    def dp_flags(self, i):
+        return self.words[self.dp_base + i * DP_WORDS + 1] & ~SNAPSHOT_PENDING
+
+    def take_trip_pending(self, i):
+        flags = self.words[self.dp_base + i * DP_WORDS + 1]
+        self.words[self.dp_base + i * DP_WORDS + 1] = flags & ~SNAPSHOT_PENDING
+        return flags & SNAPSHOT_PENDING
@@ -32,11 +32,116 @@ class SSD1306(framebuf.FrameBuffer):
         self.external_vcc = external_vcc
         self.pages = self.height // 8
         self.buffer = bytearray(self.pages * self.width)
+        self.buffer_mv = memoryview(self.buffer)
+        # Column range drawn to in each page since the last show, x0 > x1
+        # when the page is clean
+        self.dirty_x0 = bytearray(self.pages)
+        self.dirty_x1 = bytearray(self.pages)
+        self.clear_dirty()
+        # Preallocated command sequences, each sent in one bus transaction
+        self.one_cmd = bytearray(1)
+        self.pair_cmd = bytearray(2)
+        self.window_cmd = bytearray((SET_COL_ADDR, 0, 0, SET_PAGE_ADDR, 0, 0))
+        # Front buffer of the chunked transfer, allocated on first use
+        self.front = None
+        self.tx_page = self.pages
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
         self.init_display()
 
+    # Dirty region tracking: every drawing call marks the pages and columns
+    # it may have touched, show_dirty() sends just those. Optional arguments
+    # are passed on only when given, so older framebuf builds without them
+    # keep working; ellipse() and poly() need MicroPython 1.20 or later.
+    def mark_dirty(self, x, y, w, h):
+        if x < 0:
+            w += x
+            x = 0
+        if y < 0:
+            h += y
+            y = 0
+        if w <= 0 or h <= 0 or x >= self.width or y >= self.height:
+            return
+        x1 = min(x + w, self.width) - 1
+        for page in range(y >> 3, ((min(y + h, self.height) - 1) >> 3) + 1):
+            if self.dirty_x0[page] > self.dirty_x1[page]:
+                self.dirty_x0[page] = x
+                self.dirty_x1[page] = x1
+                continue
+            if self.dirty_x0[page] > x:
+                self.dirty_x0[page] = x
+            if self.dirty_x1[page] < x1:
+                self.dirty_x1[page] = x1
+
+    def mark_all_dirty(self):
+        for page in range(self.pages):
+            self.dirty_x0[page] = 0
+            self.dirty_x1[page] = self.width - 1
+
+    def clear_dirty(self):
+        for page in range(self.pages):
+            self.dirty_x0[page] = 0xFF
+            self.dirty_x1[page] = 0
+
+    def is_dirty(self):
+        for page in range(self.pages):
+            if self.dirty_x0[page] <= self.dirty_x1[page]:
+                return True
+        return False
+
+    def fill(self, c):
+        super().fill(c)
+        self.mark_all_dirty()
+
+    def pixel(self, x, y, c=None):
+        if c is None:
+            return super().pixel(x, y)
+        super().pixel(x, y, c)
+        self.mark_dirty(x, y, 1, 1)
+
+    def hline(self, x, y, w, c):
+        super().hline(x, y, w, c)
+        self.mark_dirty(x, y, w, 1)
+
+    def vline(self, x, y, h, c):
+        super().vline(x, y, h, c)
+        self.mark_dirty(x, y, 1, h)
+
+    def line(self, x1, y1, x2, y2, c):
+        super().line(x1, y1, x2, y2, c)
+        self.mark_dirty(min(x1, x2), min(y1, y2), abs(x2 - x1) + 1, abs(y2 - y1) + 1)
+
+    def fill_rect(self, x, y, w, h, c):
+        super().fill_rect(x, y, w, h, c)
+        self.mark_dirty(x, y, w, h)
+
+    def rect(self, x, y, w, h, c, *f):
+        super().rect(x, y, w, h, c, *f)
+        self.mark_dirty(x, y, w, h)
+
+    def ellipse(self, x, y, xr, yr, c, *f_m):
+        super().ellipse(x, y, xr, yr, c, *f_m)
+        self.mark_dirty(x - xr, y - yr, 2 * xr + 1, 2 * yr + 1)
+
+    def poly(self, x, y, coords, c, *f):
+        super().poly(x, y, coords, c, *f)
+        self.mark_all_dirty()
+
+    def text(self, s, x, y, c=1):
+        super().text(s, x, y, c)
+        self.mark_dirty(x, y, 8 * len(s), 8)
+
+    def blit(self, fbuf, x, y, *key_palette):
+        super().blit(fbuf, x, y, *key_palette)
+        # Sources that know their size (width/height attributes) mark just
+        # their area, anything else everything right of and below (x, y)
+        self.mark_dirty(x, y, getattr(fbuf, 'width', self.width), getattr(fbuf, 'height', self.height))
+
+    def scroll(self, xstep, ystep):
+        super().scroll(xstep, ystep)
+        self.mark_all_dirty()
+
     def init_display(self):
-        for cmd in (
+        self.write_cmds(bytes((
             SET_DISP | 0x00,  # off
             # address setting
             SET_MEM_ADDR,
@@ -66,12 +171,15 @@ class SSD1306(framebuf.FrameBuffer):
             # charge pump
             SET_CHARGE_PUMP,
             0x10 if self.external_vcc else 0x14,
-            SET_DISP | 0x01,
-        ):  # on
-            self.write_cmd(cmd)
+            SET_DISP | 0x01,  # on
+        )))
         self.fill(0)
         self.show()
 
+    def write_cmd(self, cmd):
+        self.one_cmd[0] = cmd
+        self.write_cmds(self.one_cmd)
+
     def poweroff(self):
         self.write_cmd(SET_DISP | 0x00)
 
@@ -79,40 +187,115 @@ class SSD1306(framebuf.FrameBuffer):
         self.write_cmd(SET_DISP | 0x01)
 
     def contrast(self, contrast):
-        self.write_cmd(SET_CONTRAST)
-        self.write_cmd(contrast)
+        self.pair_cmd[0] = SET_CONTRAST
+        self.pair_cmd[1] = contrast
+        self.write_cmds(self.pair_cmd)
 
     def invert(self, invert):
         self.write_cmd(SET_NORM_INV | (invert & 1))
 
-    def show(self):
-        x0 = 0
-        x1 = self.width - 1
+    def set_window(self, x0, x1, page0, page1):
         if self.width == 64:
             # displays with width of 64 pixels are shifted by 32
             x0 += 32
             x1 += 32
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
+        cmd = self.window_cmd
+        cmd[1] = x0
+        cmd[2] = x1
+        cmd[4] = page0
+        cmd[5] = page1
+        self.write_cmds(cmd)
+
+    def show(self):
+        self.finish_transfer()
+        self.set_window(0, self.width - 1, 0, self.pages - 1)
         self.write_data(self.buffer)
+        self.clear_dirty()
+
+    def show_dirty(self):
+        """Sends only the columns of each page drawn to since the last show."""
+        self.finish_transfer()
+        for page in range(self.pages):
+            x0 = self.dirty_x0[page]
+            x1 = self.dirty_x1[page]
+            if x0 > x1:
+                continue
+            self.set_window(x0, x1, page, page)
+            start = page * self.width
+            self.write_data(self.buffer_mv[start + x0:start + x1 + 1])
+        self.clear_dirty()
+
+    # Chunked transfer: start_show() copies the frame into a front buffer and
+    # step() sends it a bounded number of bytes at a time, so drawing into
+    # self.buffer can go on meanwhile and the caller decides how long the
+    # bus may be held between two other jobs.
+    def start_show(self, dirty_only=True):
+        """Queues the current frame for step(). Returns False while the previous one is still going out."""
+        if self.tx_page < self.pages:
+            return False
+        if self.front is None:
+            self.front = bytearray(len(self.buffer))
+            self.front_mv = memoryview(self.front)
+            self.tx_x0 = bytearray(self.pages)
+            self.tx_x1 = bytearray(self.pages)
+        if not dirty_only:
+            self.mark_all_dirty()
+        self.front[:] = self.buffer
+        for page in range(self.pages):
+            self.tx_x0[page] = self.dirty_x0[page]
+            self.tx_x1[page] = self.dirty_x1[page]
+        self.clear_dirty()
+        self.tx_page = 0
+        self.tx_offset = -1
+        self.next_tx_page()
+        return True
+
+    def next_tx_page(self):
+        # Skips pages with nothing to send
+        while self.tx_page < self.pages and self.tx_x0[self.tx_page] > self.tx_x1[self.tx_page]:
+            self.tx_page += 1
+
+    def transfer_busy(self):
+        return self.tx_page < self.pages
+
+    def finish_transfer(self):
+        # A blocking show must not cut into the window of a chunked one
+        while self.tx_page < self.pages:
+            self.step(self.width)
+
+    def step(self, max_bytes=32):
+        """Sends up to max_bytes of the queued frame. Returns True once all of it went out."""
+        page = self.tx_page
+        if page >= self.pages:
+            return True
+        x1 = self.tx_x1[page]
+        if self.tx_offset < 0:
+            self.tx_offset = self.tx_x0[page]
+            self.set_window(self.tx_offset, x1, page, page)
+        start = page * self.width + self.tx_offset
+        n = min(max_bytes, x1 + 1 - self.tx_offset)
+        # The controller keeps its RAM pointer between transactions
+        self.write_data(self.front_mv[start:start + n])
+        self.tx_offset += n
+        if self.tx_offset > x1:
+            self.tx_page += 1
+            self.tx_offset = -1
+            self.next_tx_page()
+        return self.tx_page >= self.pages
 
 
 class SSD1306_I2C(SSD1306):
     def __init__(self, width, height, i2c, addr=0x3C, external_vcc=False):
         self.i2c = i2c
         self.addr = addr
-        self.temp = bytearray(2)
+        self.cmd_list = [b"\x00", None]  # Co=0, D/C#=0
         self.write_list = [b"\x40", None]  # Co=0, D/C#=1
         super().__init__(width, height, external_vcc)
 
-    def write_cmd(self, cmd):
-        self.temp[0] = 0x80  # Co=1, D/C#=0
-        self.temp[1] = cmd
-        self.i2c.writeto(self.addr, self.temp)
+    def write_cmds(self, buf):
+        # A single control byte with Co=0 makes every following byte a command
+        self.cmd_list[1] = buf
+        self.i2c.writevto(self.addr, self.cmd_list)
 
     def write_data(self, buf):
         self.write_list[1] = buf
@@ -125,6 +308,9 @@ class SSD1306_SPI(SSD1306):
         dc.init(dc.OUT, value=0)
         res.init(res.OUT, value=0)
         cs.init(cs.OUT, value=1)
+        # The bus is set up once, re-init it before show() if other devices
+        # share it with different settings
+        spi.init(baudrate=self.rate, polarity=0, phase=0)
         self.spi = spi
         self.dc = dc
         self.res = res
@@ -138,16 +324,14 @@ class SSD1306_SPI(SSD1306):
         self.res(1)
         super().__init__(width, height, external_vcc)
 
-    def write_cmd(self, cmd):
-        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+    def write_cmds(self, buf):
         self.cs(1)
         self.dc(0)
         self.cs(0)
-        self.spi.write(bytearray([cmd]))
+        self.spi.write(buf)
         self.cs(1)
 
     def write_data(self, buf):
-        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
         self.cs(1)
         self.dc(1)
         self.cs(0)
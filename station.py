@@ -0,0 +1,135 @@
+# Standalone display mode: live probe and chronometer times on an SSD1306
+#
+# Each screen shows two probes (pulse times) or two chronometers (trip
+# times) in big digits, in seconds. A button to GND switches to the next
+# screen with a long press and resets what is on screen with a short one.
+# render() only reads the sensors through the view, redraws the digits that
+# changed and queues the dirty part of the frame; main.py sends it in small
+# chunks (see SSD1306.start_show/step) so serial handling is never held up
+# for long. With no host to send CA/CG, pair_probes() gives the chronometers
+# a default setup.
+
+from machine import Pin
+import time
+from bigdigits import DigitFont, Readout
+from sensing import STATUS_ARM_PENDING
+
+LONG_PRESS_MS = 800
+SCREEN_PROBES = 0
+SCREEN_CHRONOMETERS = 1
+ROWS = 2
+ROW_HEIGHT = 32
+
+
+def format_seconds(us):
+    """Microseconds as seconds with 4 decimals. Integer math, RP2040 floats are
+    single precision and get the 4th decimal wrong past a few minutes."""
+    sign = "-" if us < 0 else ""
+    us = abs(us)
+    return "%s%d.%04d" % (sign, us // 1000000, us // 100 % 10000)
+
+
+def pair_probes(probes, dps):
+    """Chronometer k times probe 2k to probe 2k+1, until a host reconfigures it."""
+    for k in range(min(len(dps), len(probes) // 2)):
+        try:
+            dps[k].set_probes(probes[2 * k], probes[2 * k + 1])
+        except ValueError:
+            # A PIO and an IRQ probe can't be timed against each other
+            pass
+
+
+class StationDisplay():
+    def __init__(self, oled, view, button_pin):
+        self.oled = oled
+        self.view = view
+        self.button = Pin(button_pin, Pin.IN, Pin.PULL_UP)
+        self.pressed_at = None
+        font = DigitFont()
+        # One label line of 8 px text above each readout, readouts start on
+        # a page boundary
+        self.readouts = [Readout(oled, font, 0, row * ROW_HEIGHT + 8, 10) for row in range(ROWS)]
+        self.screen = 0
+        self.screens = []
+        self.counts = None
+
+    def build_screens(self, probe_count, dp_count):
+        # (kind, first id) of every screen
+        self.screens = ([(SCREEN_PROBES, i) for i in range(0, probe_count, ROWS)]
+                        + [(SCREEN_CHRONOMETERS, i) for i in range(0, dp_count, ROWS)])
+        self.counts = (probe_count, dp_count)
+        self.screen = 0
+        self.draw_labels()
+
+    def draw_labels(self):
+        oled = self.oled
+        oled.fill(0)
+        for readout in self.readouts:
+            readout.invalidate()
+        if not self.screens:
+            oled.text("no probes", 0, 0)
+            return
+        kind, first = self.screens[self.screen]
+        for row in range(min(ROWS, self.counts[kind] - first)):
+            label = ("probe %d" if kind == SCREEN_PROBES else "chrono %d") % (first + row)
+            oled.text(label, 0, row * ROW_HEIGHT)
+
+    def check_button(self):
+        # Polled from render(), the frame rate is plenty for a push button
+        pressed = not self.button.value()
+        now = time.ticks_ms()
+        if pressed and self.pressed_at is None:
+            self.pressed_at = now
+        elif not pressed and self.pressed_at is not None:
+            held = time.ticks_diff(now, self.pressed_at)
+            self.pressed_at = None
+            if held >= LONG_PRESS_MS:
+                if self.screens:
+                    self.screen = (self.screen + 1) % len(self.screens)
+                    self.draw_labels()
+            else:
+                self.reset_screen()
+
+    def reset_screen(self):
+        if not self.screens:
+            return
+        kind, first = self.screens[self.screen]
+        view = self.view
+        with view:
+            items = view.probes if kind == SCREEN_PROBES else view.dps
+            for i in range(first, min(first + ROWS, len(items))):
+                items[i].reset()
+
+    def render(self):
+        """Draws the current values and queues the changed part of the frame."""
+        view = self.view
+        with view:
+            counts = (len(view.probes), len(view.dps))
+        if counts != self.counts:
+            self.build_screens(*counts)
+        self.check_button()
+        if self.screens:
+            kind, first = self.screens[self.screen]
+            for row in range(ROWS):
+                i = first + row
+                with view:
+                    if i >= counts[kind]:
+                        text = ""
+                    elif kind == SCREEN_PROBES:
+                        text = format_seconds(view.pulse_time(i))
+                    else:
+                        flags = view.dp_flags(i)
+                        # Waiting for the gates to clear, or no gates assigned
+                        if not flags or flags & STATUS_ARM_PENDING:
+                            text = "-.----"
+                        else:
+                            text = format_seconds(view.trip_time(i))
+                self.readouts[row].show(text)
+        # Skips the frame if the previous one is still going out, what
+        # changed stays marked for the next one
+        if self.oled.is_dirty():
+            self.oled.start_show()
+
+    def pump(self, max_bytes):
+        """Sends the next chunk of a queued frame. Returns True while more is left."""
+        return not self.oled.step(max_bytes)
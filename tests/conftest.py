@@ -0,0 +1,54 @@
+# Host tests. The firmware modules run unmodified on CPython with the
+# stand-in machine, micropython, framebuf, ... modules in tools/sim, like in
+# the simulator:
+#
+#   python -m pytest tests
+
+import sys
+import time
+from os import path
+
+import pytest
+
+REPO_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path[:0] = [path.join(REPO_DIR, 'tools', 'sim'), REPO_DIR, path.join(REPO_DIR, 'tools')]
+
+import board
+board.install_time()
+
+
+class FakeClock():
+    """ticks_us that only moves when the test says so."""
+    def __init__(self):
+        self.us = 1000
+
+    def __call__(self):
+        return self.us & (board.TICKS_PERIOD - 1)
+
+    def advance(self, us):
+        self.us += us
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(time, 'ticks_us', fake)
+    return fake
+
+
+@pytest.fixture
+def make_probe():
+    """Builds hard IRQ TimedSensors (or sensor_class) on simulated pins, disabled again afterwards."""
+    from sensing import TimedSensor
+    made = []
+
+    def make(pin_number, sensor_class=TimedSensor, **kwargs):
+        kwargs.setdefault('hard_irq', True)
+        probe = sensor_class(pin_number, **kwargs)
+        made.append(probe)
+        return probe
+    yield make
+    for probe in made:
+        probe.disable()
+        board.levels.pop(probe.pin_number, None)
+    board.run_scheduled()
@@ -0,0 +1,130 @@
+import pytest
+
+from ssd1306 import SSD1306_I2C
+from bigdigits import DigitFont, Readout
+
+# Commands of the init table that take one argument
+ONE_ARG = (0x20, 0x81, 0x8D, 0xA8, 0xD3, 0xD5, 0xD9, 0xDA, 0xDB)
+
+
+class ControllerI2C():
+    """I2C bus with an SSD1306 in horizontal addressing mode on it."""
+    def __init__(self, width=128, pages=8):
+        self.width = width
+        self.ram = bytearray(width * pages)
+        self.window = (0, width - 1, 0, pages - 1)
+        self.col = self.page = 0
+        self.data_bytes = 0
+
+    def writevto(self, addr, bufs):
+        control, payload = bufs[0][0], bytes(bufs[1])
+        if control == 0x40:
+            self.data(payload)
+        else:
+            self.commands(payload)
+
+    def commands(self, cmds):
+        i = 0
+        while i < len(cmds):
+            cmd = cmds[i]
+            if cmd == 0x21:
+                self.window = (cmds[i + 1], cmds[i + 2]) + self.window[2:]
+                self.col = cmds[i + 1]
+                i += 3
+            elif cmd == 0x22:
+                self.window = self.window[:2] + (cmds[i + 1], cmds[i + 2])
+                self.page = cmds[i + 1]
+                i += 3
+            else:
+                i += 2 if cmd in ONE_ARG else 1
+
+    def data(self, payload):
+        x0, x1, page0, page1 = self.window
+        for byte in payload:
+            self.ram[self.page * self.width + self.col] = byte
+            self.data_bytes += 1
+            self.col += 1
+            if self.col > x1:
+                self.col = x0
+                self.page = page0 if self.page >= page1 else self.page + 1
+
+
+@pytest.fixture
+def oled():
+    bus = ControllerI2C()
+    display = SSD1306_I2C(128, 64, bus)
+    bus.data_bytes = 0
+    return display
+
+
+def test_show_dirty_sends_only_the_drawn_columns(oled):
+    assert not oled.is_dirty()
+    oled.fill_rect(10, 20, 5, 3, 1)
+    assert list(oled.dirty_x0[2:3]) == [10] and list(oled.dirty_x1[2:3]) == [14]
+    oled.show_dirty()
+    assert oled.i2c.data_bytes == 5
+    assert oled.i2c.ram == oled.buffer
+    assert not oled.is_dirty()
+
+
+def test_drawing_off_screen_marks_nothing(oled):
+    oled.pixel(-3, 10, 1)
+    oled.hline(0, 70, 10, 1)
+    assert not oled.is_dirty()
+
+
+def test_chunked_transfer_matches_the_frame(oled):
+    oled.text("12:34", 3, 9)
+    oled.line(0, 63, 127, 40, 1)
+    assert oled.start_show()
+    # Drawing meanwhile goes into the next frame, not this one
+    expected = bytes(oled.buffer)
+    oled.fill_rect(100, 0, 10, 8, 1)
+    steps = 1
+    while not oled.step(7):
+        steps += 1
+    assert steps > 1
+    assert oled.i2c.ram == expected
+    assert oled.is_dirty()
+    assert oled.start_show()
+    oled.finish_transfer()
+    assert oled.i2c.ram == oled.buffer
+
+
+def test_blocking_show_waits_for_a_chunked_one(oled):
+    oled.fill_rect(0, 0, 128, 64, 1)
+    oled.start_show()
+    oled.step(3)
+    oled.pixel(5, 5, 0)
+    oled.show()
+    assert oled.i2c.ram == oled.buffer
+
+
+def test_readout_redraws_only_changed_digits(oled, monkeypatch):
+    readout = Readout(oled, DigitFont(), 0, 16, 8)
+    blits = []
+    real_blit = oled.blit
+    monkeypatch.setattr(oled, 'blit', lambda fbuf, x, y, *args: (blits.append(x), real_blit(fbuf, x, y, *args)))
+    readout.show("1.2345")
+    assert len(blits) == 6
+    del blits[:]
+    readout.show("1.2345")
+    assert blits == []
+    readout.show("1.2346")
+    assert len(blits) == 1
+    # A shorter text only blanks what is left of the longer one
+    del blits[:]
+    oled.clear_dirty()
+    readout.show("1.23")
+    assert blits == []
+    assert oled.is_dirty()
+
+
+def test_readout_invalidate_redraws_everything(oled, monkeypatch):
+    readout = Readout(oled, DigitFont(), 0, 16, 8)
+    readout.show("42")
+    calls = []
+    monkeypatch.setattr(oled, 'blit', lambda *args: calls.append(args))
+    readout.invalidate()
+    readout.show("42")
+    assert len(calls) == 2
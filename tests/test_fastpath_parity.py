@@ -0,0 +1,134 @@
+# fastpath.py keeps native copies of the sensing.py hot paths. It refuses to
+# import off MicroPython, so it is loaded here with the stand-in
+# micropython module, whose native/viper decorators return the function
+# unchanged, and its methods are installed on subclasses of the sensing
+# classes. Both versions then see the same edges and must agree.
+
+import builtins
+import importlib.util
+import sys
+from os import path
+
+import board
+import pytest
+
+import sensing
+from conftest import REPO_DIR
+from sensing import GateChain, TimedSensor
+
+
+@pytest.fixture
+def fastpath(monkeypatch):
+    spec = importlib.util.spec_from_file_location('fastpath_parity', path.join(REPO_DIR, 'fastpath.py'))
+    module = importlib.util.module_from_spec(spec)
+    with monkeypatch.context() as patch:
+        patch.setattr(sys.implementation, 'name', 'micropython')
+        # Only evaluated as an annotation on CPython
+        patch.setattr(builtins, 'ptr32', object, raising=False)
+        spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def native(fastpath):
+    class NativeSensor(TimedSensor):
+        pass
+
+    class NativeChain(GateChain):
+        pass
+    fastpath.install(NativeSensor, NativeChain, sensing.sensor_words,
+                     sensing._hard_scheduled, sensing._dispatch_hard_edges)
+    return NativeSensor, NativeChain
+
+
+def state(probe):
+    words = sensing.sensor_words[probe.base:probe.base + sensing.STATE_WORDS]
+    return (list(words), list(probe.edge_log), probe.is_active(),
+            probe.status_flags(), probe.get_pulse_time())
+
+
+def test_install_replaces_existing_methods(fastpath, native):
+    assert fastpath.replaced
+    for name, original in fastpath.replaced.items():
+        cls = TimedSensor if hasattr(TimedSensor, name) else GateChain
+        assert original is getattr(cls, name)
+
+
+def test_log_helpers_match(fastpath):
+    from array import array
+    byte_words, native_words = array('L', [0] * 12), array('L', [0] * 12)
+    byte_log, native_log = array('L', [0] * 64), array('L', [0] * 64)
+    for n in range(40):
+        for words, log, log_edge in ((byte_words, byte_log, sensing.log_edge),
+                                     (native_words, native_log, fastpath.log_edge)):
+            words[6 + sensing.S_NOW] = 1000 * n
+            log_edge(words, 6, log, n & 1)
+    assert byte_log == native_log
+    assert byte_words == native_words
+    for op in ('set_flags', 'clear_flags', 'take_flags'):
+        results = [getattr(module, op)(words, 3, 0x0A)
+                   for module, words in ((sensing, byte_words), (fastpath, native_words))]
+        assert results[0] == results[1]
+        assert byte_words == native_words
+
+
+@pytest.mark.parametrize('hard_irq', [True, False])
+@pytest.mark.parametrize('auto_reseting', [False, True])
+@pytest.mark.parametrize('active_low', [False, True])
+def test_probe_matches(clock, make_probe, native, hard_irq, auto_reseting, active_low):
+    kwargs = dict(hard_irq=hard_irq, auto_reseting=auto_reseting, active_low=active_low)
+    pins = (8, 9)
+    for pin in pins:
+        board.set_level(pin, active_low)
+    probes = [make_probe(8, **kwargs), make_probe(9, sensor_class=native[0], **kwargs)]
+    # Set, running, release, ignored pulse, reset while held, release again
+    for level, wait in ((1, 700), (1, 300), (0, 400), (1, 250), (0, 900),
+                        ('reset', 0), (1, 120), ('reset', 80), (0, 60)):
+        for probe in probes:
+            if level == 'reset':
+                probe.reset()
+            else:
+                board.set_level(probe.pin_number, level ^ active_low)
+        assert state(probes[0]) == state(probes[1])
+        clock.advance(wait)
+        assert state(probes[0]) == state(probes[1])
+
+
+def test_chain_matches(clock, make_probe, native):
+    chains = []
+    for pins, sensor_class, chain_class in (((2, 3, 4), TimedSensor, GateChain),
+                                            ((5, 6, 7), native[0], native[1])):
+        chain = chain_class()
+        chain.set_gates([make_probe(pin, sensor_class=sensor_class) for pin in pins])
+        chains.append(chain)
+    for gate in (0, 1, 2, 1, 0):
+        for chain in chains:
+            board.set_level(chain.gates[gate].pin_number, 1)
+        clock.advance(300)
+        assert chains[0].get_trip_time() == chains[1].get_trip_time()
+        for chain in chains:
+            board.set_level(chain.gates[gate].pin_number, 0)
+        clock.advance(4700)
+        assert chains[0].get_trip_time() == chains[1].get_trip_time()
+    for chain in chains:
+        chain.reset()
+    assert chains[0].get_trip_time() == chains[1].get_trip_time() == 0
+    for chain in chains:
+        chain.restore_probes()
+
+
+def test_hard_handler_survives_a_full_schedule_queue(clock, make_probe, native, monkeypatch):
+    probes = [make_probe(8), make_probe(9, sensor_class=native[0])]
+
+    def full_queue(func, arg):
+        raise RuntimeError("schedule queue full")
+    for probe in probes:
+        with monkeypatch.context() as patch:
+            patch.setattr(sensing.mp, 'schedule', full_queue)
+            board.set_level(probe.pin_number, 1)
+        # The latch stays clear, so the next edge or kick schedules again
+        assert not sensing._hard_scheduled[0]
+        assert probe.processed_seq != probe.edge_seq
+    sensing.kick_hard_edges()
+    board.run_scheduled()
+    assert state(probes[0]) == state(probes[1])
@@ -0,0 +1,127 @@
+import board
+import pytest
+
+import sensing
+from sensing import GateChain, STATUS_ARM_PENDING, STATUS_STARTED, STATUS_STOPPED
+
+
+def pulse(clock, pin, high_us=500):
+    board.set_level(pin, 1)
+    clock.advance(high_us)
+    board.set_level(pin, 0)
+
+
+@pytest.fixture
+def chain(make_probe):
+    gates = [make_probe(pin) for pin in (2, 3, 4)]
+    chain = GateChain()
+    chain.set_gates(gates)
+    yield chain
+    chain.restore_probes()
+
+
+def test_trip_through_every_gate(clock, chain):
+    pulse(clock, 2)
+    clock.advance(9500)
+    pulse(clock, 3)
+    clock.advance(19500)
+    pulse(clock, 4)
+    assert chain.reached == 3
+    assert chain.split_time(0) == 10000
+    assert chain.split_time(1) == 20000
+    assert chain.get_trip_time() == 30000
+    assert chain.status_flags() & STATUS_STOPPED
+    assert chain.trip_pending
+
+
+def test_running_trip_counts_up(clock, chain):
+    pulse(clock, 2)
+    clock.advance(1500)
+    assert chain.get_trip_time() == 2000
+    assert chain.status_flags() & (STATUS_STARTED | STATUS_STOPPED) == STATUS_STARTED
+
+
+def test_gate_out_of_order_is_ignored(clock, chain):
+    pulse(clock, 3)
+    assert chain.reached == 0
+    pulse(clock, 2)
+    clock.advance(1000)
+    pulse(clock, 4)
+    assert chain.reached == 1
+
+
+def test_reset_of_first_gate_starts_a_new_trip(clock, chain):
+    for pin in (2, 3, 4):
+        pulse(clock, pin)
+    for gate in chain.gates:
+        gate.reset()
+    assert chain.reached == 0
+    assert chain.get_trip_time() == 0
+    pulse(clock, 2)
+    assert chain.reached == 1
+
+
+def test_reset_of_later_gate_keeps_the_start(clock, chain):
+    for pin in (2, 3):
+        pulse(clock, pin)
+    chain.gates[1].reset()
+    assert chain.reached == 1
+
+
+def test_reset_waits_for_blocked_gate(clock, chain):
+    for pin in (2, 3, 4):
+        pulse(clock, pin)
+    chain.trip_pending = False
+    board.set_level(3, 1)
+    chain.reset()
+    assert chain.status_flags() & STATUS_ARM_PENDING
+    board.set_level(3, 0)
+    chain.update()
+    assert not chain.status_flags() & STATUS_ARM_PENDING
+    assert chain.reached == 0
+    # The host is told that arming finished
+    assert chain.trip_pending
+
+
+def test_gates_logged_before_the_dispatcher_runs(clock, chain, monkeypatch):
+    # Both edges land before the scheduled dispatcher, like on hardware when
+    # the gates are close together or wired to the same signal
+    run_scheduled = board.run_scheduled
+    with monkeypatch.context() as patch:
+        patch.setattr(board, 'run_scheduled', lambda: None)
+        board.set_level(2, 1)
+        clock.advance(50)
+        board.set_level(3, 1)
+    run_scheduled()
+    assert chain.reached == 2
+    assert chain.gates[1].status_flags() & sensing.STATUS_SET
+    clock.advance(1000)
+    assert chain.split_time(0) == 50
+
+
+def full_queue(func, arg):
+    raise RuntimeError("schedule queue full")
+
+
+def test_dispatcher_recovers_from_a_full_schedule_queue(clock, make_probe, monkeypatch):
+    probe = make_probe(6)
+    monkeypatch.setattr(sensing.mp, 'schedule', full_queue)
+    board.set_level(6, 1)
+    assert not probe.status_flags() & sensing.STATUS_SET
+    monkeypatch.undo()
+    sensing.kick_hard_edges()
+    board.run_scheduled()
+    assert probe.status_flags() & sensing.STATUS_SET
+    board.set_level(6, 0)
+    assert probe.status_flags() & sensing.STATUS_RELEASE
+
+
+def test_reset_drops_unprocessed_edges(clock, make_probe, monkeypatch):
+    probe = make_probe(6)
+    monkeypatch.setattr(sensing.mp, 'schedule', full_queue)
+    pulse(clock, 6)
+    monkeypatch.undo()
+    probe.reset()
+    assert probe.processed_seq == probe.edge_seq
+    sensing.process_hard_edges()
+    assert not probe.status_flags() & (sensing.STATUS_SET | sensing.STATUS_RELEASE)
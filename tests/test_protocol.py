@@ -0,0 +1,57 @@
+from protocol import (FrameReceiver, encode_frame, encode_frame_into, HEADER_SIZE,
+                      FRAME_OVERHEAD, MAX_PAYLOAD, SYNC)
+
+
+def receive_all(receiver, data):
+    frames = []
+    accepted = 0
+    while True:
+        accepted += receiver.write(data, accepted)
+        while receiver.next_frame():
+            frames.append((receiver.frame[0], bytes(receiver.frame[1:receiver.length])))
+        if accepted >= len(data):
+            return frames
+
+
+def test_round_trip():
+    frame = encode_frame(ord('U'), b'\x01\x02\x03')
+    assert len(frame) == FRAME_OVERHEAD + 3
+    assert receive_all(FrameReceiver(), frame) == [(ord('U'), b'\x01\x02\x03')]
+
+
+def test_encode_into_matches_encode():
+    buf = bytearray(FRAME_OVERHEAD + MAX_PAYLOAD)
+    buf[HEADER_SIZE:HEADER_SIZE + 4] = b'abcd'
+    n = encode_frame_into(buf, ord('A'), 4)
+    assert bytes(buf[:n]) == encode_frame(ord('A'), b'abcd')
+
+
+def test_byte_by_byte():
+    receiver = FrameReceiver()
+    data = encode_frame(ord('B'), b'') + encode_frame(ord('P'), bytes(range(20)))
+    frames = []
+    for i in range(len(data)):
+        frames += receive_all(receiver, data[i:i + 1])
+    assert frames == [(ord('B'), b''), (ord('P'), bytes(range(20)))]
+
+
+def test_resync_after_garbage_and_bad_crc():
+    good = encode_frame(ord('G'), b'\x00')
+    bad = bytearray(encode_frame(ord('U'), b'\x05'))
+    bad[-1] ^= 0xFF
+    receiver = FrameReceiver()
+    frames = receive_all(receiver, b'\x00\x13' + bytes([SYNC]) + bytes(bad) + good)
+    assert frames == [(ord('G'), b'\x00')]
+    assert receiver.dropped > 0
+
+
+def test_oversized_length_is_dropped():
+    bogus = bytes([SYNC, 1, ord('U'), 0xFF, 0xFF])
+    frames = receive_all(FrameReceiver(), bogus + encode_frame(ord('R'), b'\x02'))
+    assert frames == [(ord('R'), b'\x02')]
+
+
+def test_largest_payload_through_a_small_ring():
+    payload = bytes(i & 0xFF for i in range(MAX_PAYLOAD))
+    frames = receive_all(FrameReceiver(512), encode_frame(ord('E'), payload) * 3)
+    assert frames == [(ord('E'), payload)] * 3
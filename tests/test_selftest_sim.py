@@ -0,0 +1,57 @@
+# Boots the firmware in tools/sim/simulator.py with the self-test PWM looped
+# back into probes 0 and 1 and checks the measured errors over the serial
+# link, the way tools/selftest_report.py does against a board. Runs once
+# per transport (main.run_tasks and main.run_poll_loop).
+
+import subprocess
+import sys
+from os import path
+
+import pytest
+
+serial = pytest.importorskip('serial')
+
+from conftest import REPO_DIR
+from hostlink import Link
+import selftest_report
+
+SELFTEST_PIN = 22
+PERIOD_US = 10000
+SAMPLES = 50
+# The simulator runs on a desktop scheduler, these only catch real breakage
+MAX_MEDIAN_PULSE_ERROR_US = 500
+MAX_MEDIAN_TRIP_ERROR_US = 1000
+
+
+@pytest.fixture(params=['asyncio', 'poll'])
+def link(request):
+    process = subprocess.Popen(
+        [sys.executable, path.join(REPO_DIR, 'tools', 'sim', 'simulator.py'),
+         '--selftest-pin', str(SELFTEST_PIN), '--transport', request.param],
+        stderr=subprocess.PIPE, text=True)
+    try:
+        port = None
+        for line in process.stderr:
+            if line.startswith("Serial port:"):
+                port = line.split(':', 1)[1].strip()
+                break
+        assert port, "simulator did not start"
+        link = Link(port)
+        link.drain()
+        yield link
+    finally:
+        process.terminate()
+        process.wait()
+
+
+@pytest.mark.parametrize('load_qps', [0, 200])
+def test_selftest_errors_within_bounds(link, load_qps):
+    results = selftest_report.run_load(link, PERIOD_US, SAMPLES, load_qps)
+    assert results['state'] != selftest_report.SELFTEST_RUNNING
+    pulse = results['pulse_error_us']
+    trip = results['trip_error_us']
+    assert pulse['count'] == SAMPLES
+    assert results['missed_trips'] <= SAMPLES // 10
+    assert trip['count'] == SAMPLES - results['missed_trips']
+    assert abs(pulse['p50']) <= MAX_MEDIAN_PULSE_ERROR_US
+    assert 0 <= trip['p50'] <= MAX_MEDIAN_TRIP_ERROR_US
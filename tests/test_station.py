@@ -0,0 +1,61 @@
+import board
+import pytest
+
+from sensing import GateChain
+from snapshot import LiveView
+from ssd1306 import SSD1306_I2C
+from station import StationDisplay, format_seconds, pair_probes, SCREEN_CHRONOMETERS
+
+BUTTON_PIN = 14
+
+
+class NullI2C():
+    def writevto(self, addr, bufs):
+        pass
+
+
+def shown(readout):
+    return bytes(readout.chars).rstrip(b'\0').decode()
+
+
+def pulse(clock, pin, high_us=500):
+    board.set_level(pin, 1)
+    clock.advance(high_us)
+    board.set_level(pin, 0)
+
+
+@pytest.fixture
+def station(clock, make_probe):
+    board.set_level(BUTTON_PIN, 1)  # pulled up, not pressed
+    probes = [make_probe(pin) for pin in (2, 3, 4, 5)]
+    dps = [GateChain(), GateChain()]
+    pair_probes(probes, dps)
+    station = StationDisplay(SSD1306_I2C(128, 64, NullI2C()), LiveView(probes, dps), BUTTON_PIN)
+    station.render()
+    station.screen = station.screens.index((SCREEN_CHRONOMETERS, 0))
+    station.draw_labels()
+    yield station
+    for dp in dps:
+        dp.restore_probes()
+    board.levels.pop(BUTTON_PIN, None)
+
+
+def test_chronometers_time_probe_pairs_without_a_host(clock, station):
+    pulse(clock, 2)
+    clock.advance(12345)
+    pulse(clock, 3)
+    station.render()
+    assert shown(station.readouts[0]) == "0.0128"
+    assert shown(station.readouts[1]) == "0.0000"
+    pulse(clock, 4)
+    clock.advance(500)
+    station.render()
+    assert shown(station.readouts[1]) == "0.0010"
+
+
+def test_format_seconds_keeps_every_decimal():
+    # 2**24 us and beyond, where a single precision float is off
+    assert format_seconds(16777217) == "16.7772"
+    assert format_seconds(3599999999) == "3599.9999"
+    assert format_seconds(0) == "0.0000"
+    assert format_seconds(-1500) == "-0.0015"
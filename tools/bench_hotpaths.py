@@ -0,0 +1,121 @@
+# On-device microbenchmark for the sensor hot paths and the command set.
+#
+# Reports, in microseconds:
+#  - edge to timestamp latency of soft and hard IRQ capture, by driving
+#    BENCH_PIN as an output and letting the probe on the same pin see its own
+#    edges (no wiring needed, the pad input stays enabled)
+#  - the cost of each hot path method, native build next to the bytecode one
+#    when fastpath is in use
+#  - the cost of each command frame going through main.receive
+#
+# Run it on the board with the firmware files already copied over:
+#
+#   mpremote run tools/bench_hotpaths.py
+
+import time
+from machine import Pin
+import sensing
+from sensing import TimedSensor, GateChain
+import main
+from protocol import encode_frame
+
+BENCH_PIN = 15      # must not be one of the probe pins
+LATENCY_EDGES = 500
+CALLS = 2000
+COMMANDS = (
+    ('U', b'\x00'), ('A', b'\x00'), ('B', b''), ('G', b'\x00'),
+    ('E', b'\x00\x00\x00\x00\x00'), ('P', b''), ('R', b'\x00'),
+)
+
+
+class NullOutput():
+    """Swallows replies so the REPL stays readable during the run."""
+    def write(self, data):
+        return len(data)
+
+
+def report(name, samples):
+    samples.sort()
+    n = len(samples)
+    print("%-24s min %4d  p50 %4d  p99 %4d  max %4d" % (
+        name, samples[0], samples[n // 2], samples[n * 99 // 100], samples[-1]))
+
+
+def edge_latency(hard_irq):
+    sensor = TimedSensor(BENCH_PIN, hard_irq=hard_irq)
+    sensor.pin.init(Pin.OUT, value=0)
+    samples = []
+    try:
+        for n in range(LATENCY_EDGES):
+            seq = sensor.edge_seq
+            start = time.ticks_us()
+            sensor.pin.value(1 - (n & 1))
+            # Soft and scheduled callbacks run between bytecodes, spin until
+            # the edge shows up in the log
+            while sensor.edge_seq == seq:
+                pass
+            samples.append(time.ticks_diff(sensor.edge_log[((seq & sensing.EDGE_LOG_MASK) << 1)], start))
+    finally:
+        sensor.disable()
+    report("edge latency " + ("hard" if hard_irq else "soft"), samples)
+
+
+def _empty(*args):
+    pass
+
+
+def call_cost(name, func, *args):
+    start = time.ticks_us()
+    for _ in range(CALLS):
+        func(*args)
+    # Subtract the loop and call overhead of an empty function
+    empty_start = time.ticks_us()
+    for _ in range(CALLS):
+        _empty(*args)
+    empty = time.ticks_diff(time.ticks_us(), empty_start)
+    total = time.ticks_diff(empty_start, start) - empty
+    print("%-24s %6.2f us/call" % (name, total / CALLS))
+
+
+def method_costs():
+    probe = main.probes[0]
+    chain = GateChain()
+    chain.set_gates(main.probes[:2])
+    try:
+        methods = (
+            ('is_active', TimedSensor.is_active, probe),
+            ('get_pulse_time', TimedSensor.get_pulse_time, probe),
+            ('status_flags', TimedSensor.status_flags, probe),
+            ('get_trip_time', GateChain.get_trip_time, chain),
+        )
+        native = sensing.fastpath is not None
+        print("hot paths (%s):" % ("native" if native else "bytecode only"))
+        for name, method, obj in methods:
+            call_cost(name, method, obj)
+            if native and name in sensing.fastpath.replaced:
+                call_cost(name + " (bytecode)", sensing.fastpath.replaced[name], obj)
+    finally:
+        chain.restore_probes()
+
+
+def command_costs():
+    # Replies go through main.tx, which holds on to the real stream
+    stream = main.tx.stream
+    main.tx.stream = NullOutput()
+    print("commands:")
+    try:
+        for frame_type, payload in COMMANDS:
+            packet = encode_frame(ord(frame_type), payload)
+            call_cost(frame_type, main.receive, packet, len(packet))
+    finally:
+        main.tx.stream = stream
+
+
+def run():
+    for hard_irq in (False, True):
+        edge_latency(hard_irq)
+    method_costs()
+    command_costs()
+
+
+run()
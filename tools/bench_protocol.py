@@ -0,0 +1,267 @@
+# Protocol benchmark suite
+#
+# Drives the command set of main.process_command over a board's serial port
+# or over the host simulator, and measures:
+#
+#   commands   requests/s, p50/p99 round trip latency and reply bytes of each
+#              command, one request in flight at a time
+#   pipelined  requests/s of 'U' with --window requests in flight
+#   stream     pushed updates/s and bytes per update with the event stream
+#              on; with --sim also the latency from each simulated gate edge
+#              to its update being decoded on the host, and with --ui to
+#              StopwatchUI.update_instantaneous_display having run (PyQt6)
+#
+# Host CPU use is recorded for every benchmark. Results go to a JSON file
+# that --compare can put next to an earlier one:
+#
+#   python tools/bench_protocol.py --sim --json before.json
+#   ... change something ...
+#   python tools/bench_protocol.py --sim --json after.json --compare before.json
+#
+# Needs pyserial. A real board is used with --port /dev/ttyACM0 instead of
+# --sim; the stream benchmark then needs gate edges from outside.
+
+import argparse
+import bisect
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from os import path
+
+from hostlink import Link
+from protocol import FRAME_OVERHEAD
+
+TOOLS_DIR = path.dirname(path.abspath(__file__))
+REPO_DIR = path.dirname(TOOLS_DIR)
+COMMANDS = (
+    ('U', b'\x00'), ('A', b'\x00'), ('B', b''), ('G', b'\x00'),
+    ('E', b'\x00\x00\x00\x00\x00'), ('P', b''),
+)
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+class Meter():
+    """Wall and host CPU time of one benchmark."""
+    def __enter__(self):
+        self.wall = time.monotonic()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall = time.monotonic() - self.wall
+        self.cpu = time.process_time() - self.cpu
+
+    def cpu_percent(self):
+        return 100 * self.cpu / self.wall if self.wall else 0.0
+
+
+def bench_command(link, frame_type, payload, duration):
+    latencies = []
+    reply_bytes = 0
+    with Meter() as meter:
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            start = time.perf_counter()
+            body = link.request(frame_type, payload, reply=frame_type)
+            latencies.append((time.perf_counter() - start) * 1000)
+            reply_bytes = FRAME_OVERHEAD + len(body)
+    return {
+        'requests_per_s': len(latencies) / meter.wall,
+        'p50_ms': percentile(latencies, 0.5),
+        'p99_ms': percentile(latencies, 0.99),
+        'reply_bytes': reply_bytes,
+        'host_cpu_percent': meter.cpu_percent(),
+    }
+
+
+def bench_pipelined(link, window, duration):
+    reply = ord('U')
+    sent = received = 0
+    with Meter() as meter:
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            while sent - received < window:
+                link.send('U', bytes([sent & 1]))
+                sent += 1
+            for kind, _ in link.frames():
+                if kind == reply:
+                    received += 1
+        link.drain()
+    return {
+        'window': window,
+        'requests_per_s': received / meter.wall,
+        'host_cpu_percent': meter.cpu_percent(),
+    }
+
+
+def load_edges(edge_log):
+    """Returns {pin: [time, ...]} of every edge in a simulator edge log."""
+    edges = {}
+    with open(edge_log) as f:
+        for line in f:
+            at, pin, _ = line.split()
+            edges.setdefault(int(pin), []).append(float(at))
+    return edges
+
+
+def edge_latencies(updates, edges, pins):
+    # Match every pushed 'U' to the last edge on its probe before it arrived
+    latencies = []
+    for received, probe_id in updates:
+        times = edges.get(pins[probe_id], [])
+        i = bisect.bisect_right(times, received)
+        if i:
+            latencies.append((received - times[i - 1]) * 1000)
+    return latencies
+
+
+def bench_stream(link, duration, pins, ui=None, edge_log=None):
+    link.request('S', b'\x01')
+    # Start from armed probes, whatever they saw before is not pushed
+    for probe_id in range(len(pins)):
+        link.send('R', bytes([probe_id]))
+    link.request('r', b'\x00')
+    update_types = (ord('U'), ord('A'))
+    updates = []        # (arrival time, probe id) of pushed 'U' frames
+    update_bytes = count = 0
+    with Meter() as meter:
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            for kind, body in link.frames():
+                if kind not in update_types:
+                    continue
+                if ui is not None:
+                    ui.handle_frame(kind, body)
+                count += 1
+                update_bytes += FRAME_OVERHEAD + len(body)
+                # Re-arm like a user would, or the probe ignores the next trips
+                if kind == ord('U'):
+                    updates.append((time.monotonic(), body[0]))
+                    link.send('R', body[:1])
+                else:
+                    link.send('r', body[:1])
+            time.sleep(0.0002)
+    link.request('S', b'\x00')
+    link.drain()
+    results = {
+        'updates_per_s': count / meter.wall,
+        'bytes_per_update': update_bytes / count if count else 0,
+        'host_cpu_percent': meter.cpu_percent(),
+    }
+    if edge_log is not None:
+        latencies = edge_latencies(updates, load_edges(edge_log), pins)
+        key = 'edge_to_display' if ui is not None else 'edge_to_host'
+        results[key + '_p50_ms'] = percentile(latencies, 0.5)
+        results[key + '_p99_ms'] = percentile(latencies, 0.99)
+    return results
+
+
+def start_simulator(rate, edge_log):
+    """Starts tools/sim/simulator.py and returns (process, serial port)."""
+    process = subprocess.Popen(
+        [sys.executable, path.join(TOOLS_DIR, 'sim', 'simulator.py'), '--rate', str(rate),
+         '--random', '--seed', '1', '--edge-log', edge_log],
+        stderr=subprocess.PIPE, text=True)
+    for line in process.stderr:
+        if line.startswith("Serial port:"):
+            return process, line.split(':', 1)[1].strip()
+    raise RuntimeError("simulator did not start")
+
+
+def make_ui():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    sys.path.insert(0, path.join(REPO_DIR, 'ui'))
+    from PyQt6.QtWidgets import QApplication
+    import qtui
+    app = QApplication([])
+    window = qtui.StopwatchUI()
+    return app, window
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Prints every number of results next to the same one in baseline."""
+    def walk(new, old, prefix):
+        for key, value in new.items():
+            if isinstance(value, dict):
+                walk(value, old.get(key, {}), prefix + key + '.')
+            elif isinstance(value, (int, float)) and isinstance(old.get(key), (int, float)):
+                before = old[key]
+                change = (value - before) / before * 100 if before else 0.0
+                print("  %-44s %12.3f -> %12.3f  (%+.1f%%)" % (prefix + key, before, value, change))
+    print("compared with %s:" % (baseline.get('revision') or 'baseline'))
+    walk(results['benchmarks'], baseline.get('benchmarks', {}), '')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Protocol throughput and latency benchmarks")
+    parser.add_argument('--port', help="serial port of a board")
+    parser.add_argument('--sim', action='store_true', help="run against the host simulator")
+    parser.add_argument('--rate', type=float, default=200, help="simulated trips per second")
+    parser.add_argument('--duration', type=float, default=3, help="seconds per benchmark")
+    parser.add_argument('--window', type=int, default=8, help="requests in flight when pipelined")
+    parser.add_argument('--ui', action='store_true', help="pass pushed updates through StopwatchUI")
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    args = parser.parse_args()
+    if args.sim == bool(args.port):
+        parser.error("give either --port or --sim")
+
+    simulator = edge_log = None
+    if args.sim:
+        edge_log = tempfile.NamedTemporaryFile(prefix='fwcron-edges-', delete=False).name
+        simulator, port = start_simulator(args.rate, edge_log)
+    else:
+        port = args.port
+    ui = make_ui()[1] if args.ui else None
+    try:
+        link = Link(port)
+        link.drain()
+        pin_map = link.request('P', reply='P')
+        pins = list(pin_map[2:2 + pin_map[1]])
+        # Chronometer 0 over probes 0 and 1, so 'A' and 'G' have something to report
+        link.request('C', b'A\x00\x00\x01')
+        benchmarks = {'commands': {}}
+        for frame_type, payload in COMMANDS:
+            benchmarks['commands'][frame_type] = bench_command(link, frame_type, payload, args.duration)
+        benchmarks['pipelined'] = bench_pipelined(link, args.window, args.duration)
+        benchmarks['stream'] = bench_stream(link, args.duration, pins, ui, edge_log)
+    finally:
+        if simulator is not None:
+            simulator.terminate()
+            simulator.wait()
+            os.unlink(edge_log)
+
+    results = {
+        'revision': git_revision(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'target': 'simulator' if args.sim else port,
+        'duration_s': args.duration,
+        'benchmarks': benchmarks,
+    }
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Framed serial link to the firmware for the host tools in this directory.
+# Needs pyserial.
+
+import sys
+import time
+from os import path
+
+import serial
+
+# protocol.py is shared with the firmware and lives at the repository root
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+from protocol import FrameReceiver, encode_frame, FRAME_OK, FRAME_LOG
+
+
+class Link():
+    def __init__(self, port):
+        self.serial = serial.Serial(port, 115200, timeout=0)
+        self.receiver = FrameReceiver(4096)
+        self.bytes_received = 0
+
+    def send(self, frame_type, payload=b''):
+        frame = encode_frame(ord(frame_type), payload)
+        self.serial.write(frame)
+        return len(frame)
+
+    def frames(self):
+        """Yields (type, payload) of every frame received so far."""
+        data = self.serial.read(4096)
+        self.bytes_received += len(data)
+        accepted = 0
+        while True:
+            accepted += self.receiver.write(data, accepted)
+            while self.receiver.next_frame():
+                frame = self.receiver.frame
+                yield frame[0], bytes(frame[1:self.receiver.length])
+            if accepted >= len(data):
+                return
+
+    def wait_frame(self, reply, timeout=2.0):
+        """Returns the payload of the next frame of type reply, skipping others."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for kind, body in self.frames():
+                if kind == reply:
+                    return body
+                if kind == FRAME_LOG and body.startswith(b'ERR_'):
+                    raise RuntimeError(body.decode(errors='replace'))
+            time.sleep(0.0005)
+        raise TimeoutError("no %r frame" % chr(reply))
+
+    def request(self, frame_type, payload=b'', reply=None, timeout=2.0):
+        """Sends a command and returns the payload of its reply (frame type reply, or OK)."""
+        self.send(frame_type, payload)
+        return self.wait_frame(ord(reply) if reply else FRAME_OK, timeout)
+
+    def drain(self, quiet=0.1):
+        """Discards incoming frames until the link stays quiet for quiet seconds."""
+        last = time.monotonic()
+        while time.monotonic() - last < quiet:
+            for _ in self.frames():
+                last = time.monotonic()
+            time.sleep(0.001)
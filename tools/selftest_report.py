@@ -0,0 +1,103 @@
+# Host side of the timing self-test (see selftest.py on the firmware side).
+#
+# For every serial load level, starts a self-test run with the 'T' command,
+# keeps the link busy with 'U' queries at that rate until the run is done,
+# then prints the pulse and trip error statistics. Needs pyserial and a
+# board with SELFTEST_PIN set and wired to probes 0 and 1:
+#
+#   python tools/selftest_report.py /dev/ttyACM0 --period 10000 --samples 2000 --loads 0 200 1000
+#
+# It runs the same way against the host simulator, whose PWM drives the
+# looped-back probes on a simulated machine.Pin:
+#
+#   python tools/sim/simulator.py --selftest-pin 22
+#   python tools/selftest_report.py /dev/pts/N
+#
+# tests/test_selftest_sim.py does the same in CI and checks the error bounds.
+#
+# --json writes the same numbers to a file for comparison between builds.
+
+import argparse
+import json
+import struct
+import time
+
+from hostlink import Link
+
+# Layout of the 'T' frame, see main.send_selftest
+SELFTEST_HEADER_FMT = '<BLH'
+SELFTEST_HEADER_SIZE = struct.calcsize(SELFTEST_HEADER_FMT)
+SELFTEST_SERIES_FMT = '<Hllfflll'
+SELFTEST_SERIES_SIZE = struct.calcsize(SELFTEST_SERIES_FMT)
+SERIES_FIELDS = ('count', 'min', 'max', 'mean', 'stddev', 'p50', 'p90', 'p99')
+SELFTEST_RUNNING = 1
+RESULT_POLL_S = 0.5
+
+
+def parse_results(body):
+    state, period_us, missed = struct.unpack_from(SELFTEST_HEADER_FMT, body)
+    series = []
+    for i in range(2):
+        values = struct.unpack_from(SELFTEST_SERIES_FMT, body, SELFTEST_HEADER_SIZE + i * SELFTEST_SERIES_SIZE)
+        series.append(dict(zip(SERIES_FIELDS, values)))
+    return {'state': state, 'period_us': period_us, 'missed_trips': missed,
+            'pulse_error_us': series[0], 'trip_error_us': series[1]}
+
+
+def run_load(link, period_us, samples, rate):
+    """Runs one self-test while sending rate 'U' queries per second."""
+    link.request('T', struct.pack('<LH', period_us, samples))
+    interval = 1.0 / rate if rate else None
+    next_query = time.monotonic()
+    next_poll = time.monotonic() + RESULT_POLL_S
+    sent = 0
+    while True:
+        now = time.monotonic()
+        if interval is not None and now >= next_query:
+            link.send('U', bytes([sent & 1]))
+            sent += 1
+            next_query += interval
+        if now >= next_poll:
+            results = parse_results(link.request('T', reply='T'))
+            if results['state'] != SELFTEST_RUNNING:
+                results['load_qps'] = rate
+                results['queries_sent'] = sent
+                return results
+            next_poll = now + RESULT_POLL_S
+        # Throw away the 'U' replies
+        for _ in link.frames():
+            pass
+        time.sleep(min(interval or 0.001, 0.001))
+
+
+def print_report(results):
+    print("load %d q/s, %d queries, period %d us, %d missed trips" % (
+        results['load_qps'], results['queries_sent'], results['period_us'], results['missed_trips']))
+    for name in ('pulse_error_us', 'trip_error_us'):
+        s = results[name]
+        print("  %-15s n=%-5d min %5d  max %5d  mean %8.2f  stddev %7.2f  p50 %5d  p90 %5d  p99 %5d" % (
+            name, s['count'], s['min'], s['max'], s['mean'], s['stddev'], s['p50'], s['p90'], s['p99']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Timing self-test report")
+    parser.add_argument('port')
+    parser.add_argument('--period', type=int, default=10000, help="square wave period in us")
+    parser.add_argument('--samples', type=int, default=2000, help="periods sampled per load level")
+    parser.add_argument('--loads', type=int, nargs='+', default=[0, 200, 1000], help="'U' queries per second")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    link = Link(args.port)
+    runs = []
+    for rate in args.loads:
+        results = run_load(link, args.period, args.samples, rate)
+        print_report(results)
+        runs.append(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'period_us': args.period, 'samples': args.samples, 'runs': runs}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# Simulated board shared by the machine/micropython/uselect stand-ins.
+#
+# Everything runs on the thread of the firmware's main loop: pin edges from
+# a scenario, PWM waves and micropython.schedule() callbacks are all played
+# while the firmware waits in uselect, which is where a real board would run
+# its IRQ handlers as well.
+
+import heapq
+import io
+import select
+import sys
+import time
+
+TICKS_PERIOD = 1 << 30
+MP_STREAM_POLL = 3
+POLLIN = 0x0001
+
+_events = []        # heap of (due, seq, callback)
+_event_seq = 0
+_scheduled = []     # micropython.schedule() queue
+levels = {}         # pin number -> current level
+handlers = {}       # pin number -> (handler, trigger, hard, pin object)
+# Output pin -> input pins wired to it, e.g. the self-test loopback
+loopback = {}
+IRQ_FALLING = 4
+IRQ_RISING = 8
+
+
+def log(*args):
+    print(*args, file=sys.__stderr__)
+
+
+def install_time():
+    """Adds the MicroPython ticks functions to CPython's time module."""
+    time.ticks_us = lambda: (time.perf_counter_ns() // 1000) & (TICKS_PERIOD - 1)
+    time.ticks_ms = lambda: (time.perf_counter_ns() // 1_000_000) & (TICKS_PERIOD - 1)
+    time.ticks_add = lambda ticks, delta: (ticks + delta) & (TICKS_PERIOD - 1)
+    time.ticks_diff = lambda end, start: ((end - start + TICKS_PERIOD // 2) & (TICKS_PERIOD - 1)) - TICKS_PERIOD // 2
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+    time.sleep_us = lambda us: time.sleep(us / 1_000_000)
+
+
+def at(due, callback):
+    """Runs callback() once time.monotonic() reaches due."""
+    global _event_seq
+    _event_seq += 1
+    heapq.heappush(_events, (due, _event_seq, callback))
+
+
+def schedule(func, arg):
+    _scheduled.append((func, arg))
+
+
+def run_scheduled():
+    while _scheduled:
+        func, arg = _scheduled.pop(0)
+        func(arg)
+
+
+def set_level(pin_number, level):
+    """Changes the level seen on a pin and fires its IRQ, like an external signal would."""
+    level = 1 if level else 0
+    if levels.get(pin_number, 0) == level:
+        return
+    levels[pin_number] = level
+    handler = handlers.get(pin_number)
+    if handler is not None and handler[1] & (IRQ_RISING if level else IRQ_FALLING):
+        handler[0](handler[3])
+    for wired in loopback.get(pin_number, ()):
+        set_level(wired, level)
+    run_scheduled()
+
+
+def next_due():
+    """time.monotonic() of the next queued event, None when there is none."""
+    return _events[0][0] if _events else None
+
+
+def run_due():
+    now = time.monotonic()
+    while _events and _events[0][0] <= now:
+        heapq.heappop(_events)[2]()
+    run_scheduled()
+
+
+def _fileno(obj):
+    try:
+        return obj.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+def wait(objects, timeout_ms):
+    """Plays due events until one of objects is readable or timeout_ms runs out.
+
+    objects are file-like (anything with a fileno) or MicroPython style
+    pollables answering ioctl(MP_STREAM_POLL). Returns the readable ones.
+    """
+    deadline = None if timeout_ms < 0 else time.monotonic() + timeout_ms / 1000
+    files = [obj for obj in objects if _fileno(obj) is not None]
+    pollables = [obj for obj in objects if _fileno(obj) is None]
+    while True:
+        run_due()
+        ready = [obj for obj in pollables if obj.ioctl(MP_STREAM_POLL, POLLIN)]
+        now = time.monotonic()
+        # Sleep in select until data arrives, the next event or the deadline
+        wake = _events[0][0] if _events else None
+        if deadline is not None and (wake is None or deadline < wake):
+            wake = deadline
+        if ready:
+            timeout = 0
+        elif wake is None:
+            timeout = None
+        else:
+            timeout = max(0, wake - now)
+        if files:
+            readable = select.select(files, [], [], timeout)[0]
+        else:
+            readable = []
+            if timeout is None:
+                # Nothing could ever wake us up
+                return ready
+            time.sleep(timeout)
+        if ready or readable:
+            return ready + readable
+        if deadline is not None and time.monotonic() >= deadline:
+            return []
@@ -0,0 +1,107 @@
+# Stand-in for MicroPython's framebuf module, MONO_VLSB only
+#
+# Enough of FrameBuffer for ssd1306.py and bigdigits.py to draw real pixels
+# on CPython. text() has no font: every character other than a space is an
+# 8x8 box outline, which still lands on the pixels the real font may touch.
+
+MONO_VLSB = 0
+
+
+class FrameBuffer():
+    def __init__(self, buffer, width, height, format, stride=None):
+        if format != MONO_VLSB:
+            raise ValueError("only MONO_VLSB is simulated")
+        self._buf = buffer
+        self._w = width
+        self._h = height
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self._w and 0 <= y < self._h):
+            return None if c is None else None
+        i = (y >> 3) * self._w + x
+        bit = 1 << (y & 7)
+        if c is None:
+            return 1 if self._buf[i] & bit else 0
+        if c:
+            self._buf[i] |= bit
+        else:
+            self._buf[i] &= ~bit & 0xFF
+
+    def fill(self, c):
+        value = 0xFF if c else 0
+        for i in range((self._h + 7) // 8 * self._w):
+            self._buf[i] = value
+
+    def fill_rect(self, x, y, w, h, c):
+        for yy in range(max(y, 0), min(y + h, self._h)):
+            for xx in range(max(x, 0), min(x + w, self._w)):
+                self.pixel(xx, yy, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        dx, dy = abs(x2 - x1), -abs(y2 - y1)
+        sx, sy = (1 if x1 < x2 else -1), (1 if y1 < y2 else -1)
+        err = dx + dy
+        while True:
+            self.pixel(x1, y1, c)
+            if x1 == x2 and y1 == y2:
+                return
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x1 += sx
+            if e2 <= dx:
+                err += dx
+                y1 += sy
+
+    def ellipse(self, x, y, xr, yr, c, f=False, m=15):
+        # Quadrant mask m is ignored
+        for yy in range(-yr, yr + 1):
+            for xx in range(-xr, xr + 1):
+                inside = (xx * xx * yr * yr + yy * yy * xr * xr) <= xr * xr * yr * yr
+                if inside and (f or abs(xx) == xr or abs(yy) == yr or
+                               ((abs(xx) + 1) ** 2 * yr * yr + yy * yy * xr * xr) > xr * xr * yr * yr or
+                               (xx * xx * yr * yr + (abs(yy) + 1) ** 2 * xr * xr) > xr * xr * yr * yr):
+                    self.pixel(x + xx, y + yy, c)
+
+    def poly(self, x, y, coords, c, f=False):
+        # Outline only, f is ignored
+        n = len(coords) // 2
+        for i in range(n):
+            j = (i + 1) % n
+            self.line(x + coords[2 * i], y + coords[2 * i + 1], x + coords[2 * j], y + coords[2 * j + 1], c)
+
+    def text(self, s, x, y, c=1):
+        for i in range(len(s)):
+            if s[i] != ' ':
+                self.rect(x + 8 * i, y, 8, 8, c)
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        for yy in range(fbuf._h):
+            for xx in range(fbuf._w):
+                value = fbuf.pixel(xx, yy)
+                if value != key:
+                    self.pixel(x + xx, y + yy, value)
+
+    def scroll(self, xstep, ystep):
+        old = bytearray(self._buf)
+        copy = FrameBuffer(old, self._w, self._h, MONO_VLSB)
+        for yy in range(self._h):
+            for xx in range(self._w):
+                sx, sy = xx - xstep, yy - ystep
+                if 0 <= sx < self._w and 0 <= sy < self._h:
+                    self.pixel(xx, yy, copy.pixel(sx, sy))
@@ -0,0 +1,107 @@
+# Stand-in for MicroPython's machine module, backed by board.py
+
+import time
+import board
+
+
+class Pin():
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = board.IRQ_FALLING
+    IRQ_RISING = board.IRQ_RISING
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = self.IN
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self.mode = mode
+        if value is not None:
+            self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return board.levels.get(self.id, 0)
+        if self.mode == self.OUT:
+            # An output pin still sees (and interrupts on) its own level
+            board.set_level(self.id, value)
+
+    __call__ = value
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def toggle(self):
+        self.value(1 - self.value())
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        if handler is None:
+            board.handlers.pop(self.id, None)
+        else:
+            board.handlers[self.id] = (handler, trigger, hard, self)
+
+
+class PWM():
+    """Square wave on a pin, played as edges by the board."""
+    def __init__(self, pin):
+        self.pin = pin
+        self.pin.init(Pin.OUT)
+        self.frequency = 1000
+        self.duty = 0
+        self.generation = 0
+
+    def freq(self, value=None):
+        if value is None:
+            return self.frequency
+        self.frequency = value
+        self.restart()
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self.duty
+        self.duty = value
+        self.restart()
+
+    def deinit(self):
+        self.duty = 0
+        self.restart()
+
+    def restart(self):
+        # Waves already queued check the generation and stop
+        self.generation += 1
+        self.pin.value(0)
+        if self.duty:
+            self.edge(time.monotonic(), 1, self.generation)
+
+    def edge(self, due, level, generation):
+        if generation != self.generation:
+            return
+        self.pin.value(level)
+        period = 1 / self.frequency
+        high = period * self.duty / 65536
+        due += high if level else period - high
+        board.at(due, lambda: self.edge(due, 1 - level, generation))
+
+
+class UART():
+    def __init__(self, id, baudrate=115200, **kwargs):
+        raise OSError("the simulator only provides the REPL link, keep USE_REPL_COMM on")
+
+
+class _Mem32(dict):
+    def __missing__(self, address):
+        return 0
+
+mem32 = _Mem32()
+
+
+def freq():
+    return 125_000_000
@@ -0,0 +1,34 @@
+# Stand-in for MicroPython's micropython module
+
+import board
+
+
+def const(value):
+    return value
+
+
+def schedule(func, arg):
+    board.schedule(func, arg)
+
+
+def kbd_intr(char):
+    pass
+
+
+def heap_lock():
+    pass
+
+
+def heap_unlock():
+    return 0
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def native(func):
+    return func
+
+
+viper = native
@@ -0,0 +1,175 @@
+# Host simulator for the firmware
+#
+# Runs main.py and sensing.py unmodified on CPython, with the stand-in
+# machine, micropython, uselect, ustruct, uasyncio and framebuf modules next
+# to this file. The firmware's REPL link is a pty, so the UI or any host tool can
+# open it like a board:
+#
+#   python tools/sim/simulator.py --rate 50
+#   Serial port: /dev/pts/7
+#
+# Gate edges come from a scenario played on the probe pins:
+#   --rate N           N trips per second through the gates, in probe order
+#   --random           random trip start times (Poisson) and split times
+#   --script FILE      replay lines of "<time ms> <probe id> <level>" instead
+#   --edge-log FILE    write "<time.monotonic()> <pin> <level>" for every
+#                      scenario edge, for latency measurements on the host
+#   --selftest-pin N   enable the 'T' self-test with pin N looped back into
+#                      probes 0 and 1 (run it without a scenario, whose
+#                      edges would land on the same probes)
+#   --transport T      'asyncio' (main.run_tasks) or 'poll' (main.run_poll_loop),
+#                      by default whichever main.USE_ASYNCIO picks
+#
+# Probe state (probes.json) is kept in a temporary directory unless
+# --state-dir is given.
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tty
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(os.path.dirname(SIM_DIR))
+sys.path.insert(0, SIM_DIR)
+sys.path.insert(1, REPO_DIR)
+
+import board
+
+
+class Console():
+    """sys.stdin/sys.stdout replacement on the firmware end of the pty."""
+    def __init__(self, fd):
+        self.fd = fd
+        self.buffer = self
+
+    def fileno(self):
+        return self.fd
+
+    def readinto(self, buf, size=None):
+        data = os.read(self.fd, size or len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        data = bytes(data)
+        written = 0
+        while written < len(data):
+            written += os.write(self.fd, data[written:])
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+edge_log = None
+
+def inject(pin, level):
+    """Plays one scenario edge."""
+    if edge_log is not None:
+        edge_log.write("%.6f %d %d\n" % (time.monotonic(), pin, level))
+    board.set_level(pin, level)
+
+
+class Scenario():
+    """Plays trips through the gates on the board's event queue."""
+    def __init__(self, pins, rate, split_ms, pulse_ms, randomize, rng):
+        self.pins = pins
+        self.rate = rate
+        self.split_ms = split_ms
+        self.pulse_ms = pulse_ms
+        self.randomize = randomize
+        self.rng = rng
+        self.trips = 0
+
+    def start(self):
+        board.at(time.monotonic(), self.trip)
+
+    def trip(self):
+        now = time.monotonic()
+        due = now
+        for pin in self.pins:
+            split = self.split_ms * (self.rng.uniform(0.5, 1.5) if self.randomize else 1)
+            self.edge(due, pin, 1)
+            self.edge(due + self.pulse_ms / 1000, pin, 0)
+            due += split / 1000
+        self.trips += 1
+        interval = self.rng.expovariate(self.rate) if self.randomize else 1 / self.rate
+        board.at(now + interval, self.trip)
+
+    def edge(self, due, pin, level):
+        board.at(due, lambda: inject(pin, level))
+
+
+def play_script(path, pins):
+    """Queues every "<time ms> <probe id> <level>" line of path."""
+    start = time.monotonic()
+    with open(path) as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if not line:
+                continue
+            at_ms, probe_id, level = line.split()
+            pin = pins[int(probe_id)]
+            board.at(start + float(at_ms) / 1000, lambda pin=pin, level=int(level): inject(pin, level))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the firmware on a simulated board")
+    parser.add_argument('--rate', type=float, default=0, help="trips per second, 0 for none")
+    parser.add_argument('--random', action='store_true', help="randomize trip start and split times")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--split-ms', type=float, default=20, help="time between consecutive gates")
+    parser.add_argument('--pulse-ms', type=float, default=5, help="how long each gate stays blocked")
+    parser.add_argument('--script', help="file of '<time ms> <probe id> <level>' lines to replay")
+    parser.add_argument('--edge-log', help="file to log scenario edges to")
+    parser.add_argument('--selftest-pin', type=int, default=None)
+    parser.add_argument('--state-dir', help="where probes.json is kept")
+    parser.add_argument('--transport', choices=('asyncio', 'poll'), default=None)
+    args = parser.parse_args()
+
+    global edge_log
+    board.install_time()
+    if args.edge_log:
+        edge_log = open(args.edge_log, 'w', buffering=1)
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    board.log("Serial port:", os.ttyname(slave))
+    os.chdir(args.state_dir or tempfile.mkdtemp(prefix='fwcron-sim-'))
+
+    # The firmware talks to sys.stdin/sys.stdout like on the board, the
+    # simulator only writes to stderr from here on
+    sys.stdin = sys.stdout = Console(master)
+    import main as firmware
+    import selftest
+
+    pins = [firmware.pin_map[i] for i in range(len(firmware.probes))]
+    if args.selftest_pin is not None:
+        firmware.selftest = selftest.TimingSelfTest(args.selftest_pin)
+        board.loopback[args.selftest_pin] = pins[:2]
+    if args.script:
+        play_script(args.script, pins)
+    elif args.rate:
+        Scenario(pins, args.rate, args.split_ms, args.pulse_ms, args.random, random.Random(args.seed)).start()
+
+    transport = args.transport or ('asyncio' if firmware.USE_ASYNCIO else 'poll')
+    board.log("Transport:", transport)
+    try:
+        if transport == 'asyncio':
+            import uasyncio
+            uasyncio.run(firmware.run_tasks())
+        else:
+            firmware.run_poll_loop()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Keep the slave open until here so a closing client doesn't hang up the pty
+        os.close(slave)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Stand-in for MicroPython's uasyncio module, on top of CPython's asyncio.
+#
+# Adds what main.py uses on top of the CPython API: sleep_ms, ThreadSafeFlag
+# and a StreamReader with readinto(). run() also plays the board's queued
+# pin edges, PWM waves and scheduled callbacks while the tasks wait, which
+# the poll loop gets from the uselect stand-in.
+import asyncio as _asyncio
+import time
+from asyncio import *
+
+import board
+
+# Longest the board waits between two looks at its event queue, events
+# queued meanwhile (PWM edges, new scenario trips) can land earlier
+BOARD_SLICE_S = 0.0005
+# The selector rounds its timeout up to whole milliseconds, closer to the
+# next event than this the board only yields to the other tasks instead
+BOARD_SPIN_S = 0.002
+
+
+async def sleep_ms(ms):
+    await _asyncio.sleep(ms / 1000)
+
+
+class ThreadSafeFlag():
+    def __init__(self):
+        self.event = _asyncio.Event()
+
+    def set(self):
+        self.event.set()
+
+    async def wait(self):
+        await self.event.wait()
+        self.event.clear()
+
+
+class StreamReader():
+    def __init__(self, stream, extra=None):
+        self.stream = stream
+
+    async def readinto(self, buf):
+        loop = _asyncio.get_running_loop()
+        fd = self.stream.fileno()
+        readable = loop.create_future()
+
+        def ready():
+            if not readable.done():
+                readable.set_result(None)
+        loop.add_reader(fd, ready)
+        try:
+            await readable
+        finally:
+            loop.remove_reader(fd)
+        return self.stream.readinto(buf)
+
+
+async def _play_board():
+    while True:
+        board.run_due()
+        due = board.next_due()
+        if due is not None and due - time.monotonic() < BOARD_SPIN_S:
+            await _asyncio.sleep(0)
+        else:
+            await _asyncio.sleep(BOARD_SLICE_S)
+
+
+def run(coro):
+    async def with_board():
+        player = _asyncio.ensure_future(_play_board())
+        try:
+            return await coro
+        finally:
+            player.cancel()
+    return _asyncio.run(with_board())
@@ -0,0 +1,28 @@
+# Stand-in for MicroPython's uselect module, backed by board.py
+
+import board
+
+POLLIN = 0x0001
+POLLOUT = 0x0004
+POLLERR = 0x0008
+POLLHUP = 0x0010
+
+
+class poll():
+    def __init__(self):
+        self.objects = {}
+
+    def register(self, obj, eventmask=POLLIN | POLLOUT):
+        self.objects[id(obj)] = obj
+
+    def unregister(self, obj):
+        self.objects.pop(id(obj), None)
+
+    def modify(self, obj, eventmask):
+        self.objects[id(obj)] = obj
+
+    def poll(self, timeout=-1):
+        return [(obj, POLLIN) for obj in board.wait(list(self.objects.values()), timeout)]
+
+    def ipoll(self, timeout=-1, flags=0):
+        return iter(self.poll(timeout))
@@ -0,0 +1,2 @@
+# Stand-in for MicroPython's ustruct module
+from struct import *
@@ -11,8 +11,11 @@ import struct
 from os import path
 bundle_dir = path.abspath(path.dirname(__file__))
 
+# protocol.py is shared with the firmware and lives at the repository root
+sys.path.insert(0, path.dirname(bundle_dir))
+from protocol import FrameReceiver, encode_frame, FRAME_OK, FRAME_LOG
+
 
-END_PACKET_DELIMITER = b'akb'
 RESET_PROBE_COMMAND = b'R'
 RESET_AVERAGE_PROBE = b'r'
 REQUEST_AVERAGE_UPDATE = b'A'
@@ -20,6 +23,20 @@ REQUEST_PROBE_UPDATE = b'U'
 CONFIGURE_AVERAGE_MODE = b'CA'
 CONFIGURE_RESTORE_AVERAGE_PROBE = b'CI'
 CONFIGURE_PROBE_COUNT = b'CP'
+SUBSCRIBE_EVENTS = b'S'
+REQUEST_BULK_STATUS = b'B'
+REQUEST_PIN_MAP = b'P'
+
+# Records of the bulk status packet, see main.send_bulk_status
+PROBE_STATUS_FMT = '<LBLL'
+PROBE_STATUS_SIZE = struct.calcsize(PROBE_STATUS_FMT)
+DP_STATUS_FMT = '<LB'
+DP_STATUS_SIZE = struct.calcsize(DP_STATUS_FMT)
+# DualPoint flag: reset requested, waiting for both gates to clear
+DP_ARM_PENDING = 0x08
+
+# Let the firmware push updates on every gate edge instead of polling it
+USE_EVENT_STREAM = True
 
 # --- Stylesheet Definition ---
 path_to_qss = path.join(bundle_dir, 'stylesheet.qss')
@@ -40,7 +57,7 @@ class StopwatchUI(QWidget):
         self.selected_probe_a = 0
         self.selected_probe_b = 1
         self.serial = QSerialPort()
-        self.serial_buffer = b''
+        self.receiver = FrameReceiver(4096)
         
         # Set object name for the main window if needed for styling
         self.setObjectName("MainWindow")
@@ -425,6 +442,9 @@ class StopwatchUI(QWidget):
     def reset_specific_average(self, chrono_id):
         self.send_command(RESET_AVERAGE_PROBE + bytes([chrono_id]))
         self.average_chronometers[chrono_id]['time_display'].setText("0.0000")
+        # The reset returns at once, ask whether the pair is armed or still
+        # waiting for a blocked gate
+        self.send_command(REQUEST_BULK_STATUS)
 
 
     def update_mode_availability(self):
@@ -524,6 +544,10 @@ class StopwatchUI(QWidget):
 
 
     def apply_probe_configuration(self):
+        # Send configuration command to the microcontroller first: it rebuilds
+        # the chronometers, so they are configured again below
+        self.send_command(CONFIGURE_PROBE_COUNT + bytes([self.probe_count]))
+
         # Update selectors *before* sending command, so they are correct when command is processed
         self.update_average_selectors()
 
@@ -534,13 +558,23 @@ class StopwatchUI(QWidget):
                 probe_b_idx = chrono['probe_b_selector'].currentIndex()
                 self.configure_specific_average_mode(i, probe_a_idx, probe_b_idx)
 
-        # Send configuration command to the microcontroller
-        self.send_command(CONFIGURE_PROBE_COUNT + bytes([self.probe_count]))
-
         QMessageBox.information(self, "Configuration Applied",
                                 f"Number of active probes set to {self.probe_count}.")
 
 
+    def set_max_probes(self, max_probes):
+        """Adjusts the UI to the number of probes wired to the device."""
+        for probe_id in range(self.max_probes, max_probes):
+            self.probes[probe_id] = BarrierProbe(probe_id)
+            frame = self.create_instantaneous_probe_frame(probe_id)
+            self.probe_frames[probe_id] = frame
+            # Insert before the stretch item
+            self.instantaneous_layout.insertWidget(self.instantaneous_layout.count() - 1, frame)
+            frame.setVisible(probe_id < self.probe_count)
+        self.max_probes = max_probes
+        # Clamps the current value, which goes through update_probe_count
+        self.probe_count_spinner.setMaximum(max_probes)
+
     def reset_all_chronometers(self):
         print("UI:", "Resetting all active probes")
         # Reset all *active* probes
@@ -565,6 +599,9 @@ class StopwatchUI(QWidget):
 
     def connect_serial(self):
         if self.serial.isOpen():
+            if USE_EVENT_STREAM:
+                self.send_command(SUBSCRIBE_EVENTS + bytes([0]))
+                self.serial.flush()
             self.serial.close()
             print("UI:", "Disconnected.")
             self.connect_button.setText("Connect")
@@ -585,11 +622,15 @@ class StopwatchUI(QWidget):
             # Change button style on connect for visual feedback
             self.connect_button.setStyleSheet("background-color: #4caf50;") # Green when connected
 
-            # Send the initial probe count configuration upon connection
-            self.apply_probe_configuration()
-            # Start polling timer only after connection? Or let it run always?
-            # Let's ensure timer is running.
-            if not self.timer.isActive():
+            # Adopt the device's stored probe configuration, CP is only
+            # sent when the user applies a new count
+            self.send_command(REQUEST_PIN_MAP)
+            if USE_EVENT_STREAM:
+                # The firmware pushes U/A packets by itself, no polling needed
+                self.send_command(SUBSCRIBE_EVENTS + bytes([1]))
+                # Pick up whatever happened before the subscription
+                self.send_command(REQUEST_BULK_STATUS)
+            elif not self.timer.isActive():
                 self.timer.start(200) # Poll every 200ms
 
         else:
@@ -657,9 +698,10 @@ class StopwatchUI(QWidget):
 
 
     def send_command(self, command: bytes):
+        """Sends command as a frame: its first byte is the type, the rest the payload."""
         if self.serial.isOpen() and self.serial.isWritable():
-            #print("UI:", f"Sending: {command + END_PACKET_DELIMITER}") # Debug
-            self.serial.write(command + END_PACKET_DELIMITER)
+            #print("UI:", f"Sending: {command}") # Debug
+            self.serial.write(encode_frame(command[0], command[1:]))
         elif not self.serial.isOpen():
             print("UI:", "Serial port not open. Cannot send command.")
         else: # Port is open but not writable?
@@ -669,39 +711,72 @@ class StopwatchUI(QWidget):
     def read_serial_data(self):
         if not self.serial.bytesAvailable():
             return
-        self.serial_buffer += self.serial.readAll().data()
-
-        # Process all complete packets in the buffer
-        while END_PACKET_DELIMITER in self.serial_buffer:
-            #print("UI:", self.serial_buffer) # Debug
-            pkt, self.serial_buffer = self.serial_buffer.split(END_PACKET_DELIMITER, 1)
-
-            # Add basic validation for packet length
-            if not pkt: # Skip empty packets
-                continue
-
-            command_code = bytes([pkt[0]]) # Get the first byte as command code
-            payload = pkt[1:]
-
-            try:
-                if command_code == REQUEST_AVERAGE_UPDATE and len(payload) >= 5: # 1 byte chrono_id + 4 bytes time
-                    chrono_id, average_time = struct.unpack('<BL', payload[:5])
-                    # print("UI:", f"Parsed Average Update: Chrono ID {chrono_id}, Time {average_time}") # Debug
-                    self.update_specific_average_display(chrono_id, average_time)
-                elif command_code == REQUEST_PROBE_UPDATE and len(payload) >= 5: # 1 byte probe_id + 4 bytes time
-                    probe_id, pulse_time = struct.unpack('<BL', payload[:5])
-                    # print("UI:", f"Parsed Probe Update: Probe ID {probe_id}, Time {pulse_time}") # Debug
-                    self.update_instantaneous_display(probe_id, pulse_time)
-                elif command_code == b'OK':
-                    pass
-                else:
-                    print("UI:", f"Warning: Received unknown or malformed packet: {pkt}")
-            except struct.error as e:
-                print("UI:", f"Error unpacking packet {pkt}: {e}")
-            except IndexError as e:
-                print("UI:", f"Error processing packet {pkt} due to insufficient length: {e}")
+        data = self.serial.readAll().data()
+
+        # Feed the receive ring in pieces it can hold, handling every complete frame
+        accepted = 0
+        while accepted < len(data):
+            accepted += self.receiver.write(data, accepted)
+            while self.receiver.next_frame():
+                frame = bytes(self.receiver.frame[:self.receiver.length])
+                self.handle_frame(frame[0], frame[1:])
+
+
+    def handle_frame(self, frame_type, payload):
+        try:
+            if frame_type == REQUEST_AVERAGE_UPDATE[0] and len(payload) >= 5: # 1 byte chrono_id + 4 bytes time
+                chrono_id, average_time = struct.unpack('<BL', payload[:5])
+                # print("UI:", f"Parsed Average Update: Chrono ID {chrono_id}, Time {average_time}") # Debug
+                self.update_specific_average_display(chrono_id, average_time)
+            elif frame_type == REQUEST_PROBE_UPDATE[0] and len(payload) >= 5: # 1 byte probe_id + 4 bytes time
+                probe_id, pulse_time = struct.unpack('<BL', payload[:5])
+                # print("UI:", f"Parsed Probe Update: Probe ID {probe_id}, Time {pulse_time}") # Debug
+                self.update_instantaneous_display(probe_id, pulse_time)
+            elif frame_type == REQUEST_BULK_STATUS[0] and len(payload) >= 2:
+                self.handle_bulk_status(payload)
+            elif frame_type == REQUEST_PIN_MAP[0] and len(payload) >= 2:
+                active_count, pin_count = struct.unpack_from('<BB', payload, 0)
+                print("UI:", f"Device has {active_count} active probes, pins {list(payload[2:2 + pin_count])}")
+                self.set_max_probes(pin_count)
+                # Goes through update_probe_count, which only changes the UI
+                self.probe_count_spinner.setValue(active_count)
+                # Chronometers are not stored on the device, set them up again
+                if self.pages.currentIndex() == 1:
+                    for i, chrono in enumerate(self.average_chronometers):
+                        probe_a_idx = chrono['probe_a_selector'].currentIndex()
+                        probe_b_idx = chrono['probe_b_selector'].currentIndex()
+                        self.configure_specific_average_mode(i, probe_a_idx, probe_b_idx)
+            elif frame_type == FRAME_OK:
+                pass
+            elif frame_type == FRAME_LOG:
+                print("UI:", "Device:", payload.decode(errors='replace'))
+            else:
+                print("UI:", f"Warning: Received unknown or malformed frame: {bytes([frame_type]) + payload}")
+        except struct.error as e:
+            print("UI:", f"Error unpacking frame {bytes([frame_type]) + payload}: {e}")
 
 
+    def handle_bulk_status(self, payload):
+        probe_count, dp_count = struct.unpack_from('<BB', payload, 0)
+        if len(payload) < 2 + probe_count * PROBE_STATUS_SIZE + dp_count * DP_STATUS_SIZE:
+            print("UI:", f"Warning: Truncated bulk status packet: {payload}")
+            return
+        offset = 2
+        for probe_id in range(probe_count):
+            pulse_time, flags, last_set, last_release = struct.unpack_from(PROBE_STATUS_FMT, payload, offset)
+            offset += PROBE_STATUS_SIZE
+            self.probes.setdefault(probe_id, BarrierProbe(probe_id)).pulse_time = pulse_time
+            if probe_id < self.probe_count:
+                self.update_instantaneous_display(probe_id, pulse_time)
+        for chrono_id in range(dp_count):
+            trip_time, flags = struct.unpack_from(DP_STATUS_FMT, payload, offset)
+            offset += DP_STATUS_SIZE
+            if chrono_id < len(self.average_chronometers):
+                if flags & DP_ARM_PENDING:
+                    self.average_chronometers[chrono_id]['time_display'].setText("ARMING")
+                else:
+                    self.update_specific_average_display(chrono_id, trip_time)
+
     def update_specific_average_display(self, chrono_id, average_time):
         if chrono_id < len(self.average_chronometers):
             # Convert microseconds to seconds for display
@@ -735,16 +810,8 @@ class StopwatchUI(QWidget):
         if not self.serial.isOpen():
             return
 
-        current_page_index = self.pages.currentIndex()
-
-        if current_page_index == 0:  # Instantaneous mode
-            # Only poll *active* probes
-            for probe_id in range(self.probe_count):
-                self.send_command(REQUEST_PROBE_UPDATE + bytes([probe_id]))
-        elif current_page_index == 1:  # Average mode
-            # Poll each *configured* average chronometer
-            for i in range(len(self.average_chronometers)):
-                self.send_command(REQUEST_AVERAGE_UPDATE + bytes([i]))
+        # A single request returns every probe and chronometer at once
+        self.send_command(REQUEST_BULK_STATUS)
 
 
     def resizeEvent(self, event):